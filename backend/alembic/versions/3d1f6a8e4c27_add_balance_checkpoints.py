@@ -0,0 +1,36 @@
+"""Add_balance_checkpoints
+
+Revision ID: 3d1f6a8e4c27
+Revises: 8f3a2c6d9b10
+Create Date: 2026-10-17 13:41:09.255864
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d1f6a8e4c27'
+down_revision: Union[str, None] = '8f3a2c6d9b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('balance_checkpoints',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=True),
+    sa.Column('balances', sa.JSON(), nullable=False),
+    sa.Column('covered_until', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_balance_checkpoints_group_id'), 'balance_checkpoints', ['group_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_balance_checkpoints_group_id'), table_name='balance_checkpoints')
+    op.drop_table('balance_checkpoints')
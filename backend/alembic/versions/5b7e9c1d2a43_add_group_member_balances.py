@@ -0,0 +1,52 @@
+"""Add_group_member_balances
+
+Revision ID: 5b7e9c1d2a43
+Revises: c4e0c4f90ac0
+Create Date: 2026-10-17 09:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e9c1d2a43'
+down_revision: Union[str, None] = 'c4e0c4f90ac0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('group_member_balances',
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+
+    # Backfill every existing member from the full expense/settlement history
+    op.execute("""
+        INSERT INTO group_member_balances (group_id, user_id, balance, updated_at)
+        SELECT m.group_id, m.user_id, ROUND(CAST(COALESCE(SUM(t.amount), 0) AS numeric), 2), now()
+        FROM (SELECT DISTINCT group_id, user_id FROM group_members) m
+        LEFT JOIN (
+            SELECT group_id, paid_by_id AS user_id, amount FROM expenses
+            UNION ALL
+            SELECT e.group_id, s.user_id, -s.amount
+            FROM expense_splits s JOIN expenses e ON e.id = s.expense_id
+            UNION ALL
+            SELECT group_id, paid_by_id AS user_id, amount FROM settlements
+            UNION ALL
+            SELECT group_id, paid_to_id AS user_id, -amount FROM settlements
+        ) t ON t.group_id = m.group_id AND t.user_id = m.user_id
+        GROUP BY m.group_id, m.user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('group_member_balances')
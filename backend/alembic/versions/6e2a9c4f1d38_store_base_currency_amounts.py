@@ -0,0 +1,91 @@
+"""Store_base_currency_amounts
+
+Revision ID: 6e2a9c4f1d38
+Revises: 9b4e6d2f8c15
+Create Date: 2026-10-17 21:42:17.583204
+
+"""
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2a9c4f1d38'
+down_revision: Union[str, None] = '9b4e6d2f8c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Currency the stored rates are quoted against (units per unit of it)
+REFERENCE_CURRENCY = os.getenv("FX_REFERENCE_CURRENCY", "EUR")
+
+
+def _rate(currency: str, day: str) -> str:
+    # Latest rate published on or before day
+    return (
+        f"(CASE WHEN {currency} = '{REFERENCE_CURRENCY}' THEN 1 ELSE ("
+        f"SELECT fx_rates.rate FROM fx_rates WHERE fx_rates.currency = {currency} "
+        f"AND fx_rates.date <= {day} ORDER BY fx_rates.date DESC LIMIT 1) END)"
+    )
+
+
+def upgrade() -> None:
+    op.add_column('expenses', sa.Column('base_amount_cents', sa.BigInteger(), nullable=True))
+    op.add_column('expense_splits', sa.Column('base_amount_cents', sa.BigInteger(), nullable=True))
+    op.add_column('settlements', sa.Column('base_amount_cents', sa.BigInteger(), nullable=True))
+
+    # Records in another currency than their group's were converted on every
+    # read so far, at the rate of their own date (the expense date, or the
+    # day a settlement was created); store them converted the same way, half
+    # up to the cent
+    expense_day = "CAST(expenses.date AS date)"
+    op.execute(
+        "UPDATE expenses SET base_amount_cents = converted.cents FROM ("
+        "SELECT expenses.id, ROUND(expenses.amount_cents * ("
+        f"{_rate('groups.base_currency', expense_day)} / {_rate('expenses.currency', expense_day)}"
+        ")) AS cents "
+        "FROM expenses JOIN groups ON groups.id = expenses.group_id "
+        "WHERE expenses.currency <> groups.base_currency"
+        ") AS converted WHERE expenses.id = converted.id"
+    )
+
+    # Allocate each converted amount over the splits by largest remainder,
+    # remainders going to the lowest user id on ties
+    op.execute(
+        "UPDATE expense_splits SET base_amount_cents = allocated.cents FROM ("
+        "SELECT id, part + CASE WHEN place <= base - CAST(SUM(part) OVER (PARTITION BY expense_id) AS bigint) "
+        "THEN 1 ELSE 0 END AS cents FROM ("
+        "SELECT id, expense_id, base, part, ROW_NUMBER() OVER ("
+        "PARTITION BY expense_id ORDER BY remainder DESC, CAST(user_id AS text)"
+        ") AS place FROM ("
+        "SELECT id, expense_id, user_id, base, "
+        "base * amount_cents / total AS part, base * amount_cents % total AS remainder FROM ("
+        "SELECT expense_splits.id, expense_splits.expense_id, expense_splits.user_id, "
+        "expense_splits.amount_cents, expenses.base_amount_cents AS base, "
+        "CAST(SUM(expense_splits.amount_cents) OVER (PARTITION BY expense_splits.expense_id) AS bigint) AS total "
+        "FROM expense_splits JOIN expenses ON expenses.id = expense_splits.expense_id "
+        "WHERE expenses.base_amount_cents IS NOT NULL"
+        ") AS shares WHERE total > 0"
+        ") AS parts"
+        ") AS ranked"
+        ") AS allocated WHERE expense_splits.id = allocated.id"
+    )
+
+    settlement_day = "CAST(settlements.created_at AS date)"
+    op.execute(
+        "UPDATE settlements SET base_amount_cents = converted.cents FROM ("
+        "SELECT settlements.id, ROUND(settlements.amount_cents * ("
+        f"{_rate('groups.base_currency', settlement_day)} / {_rate('settlements.currency', settlement_day)}"
+        ")) AS cents "
+        "FROM settlements JOIN groups ON groups.id = settlements.group_id "
+        "WHERE settlements.currency <> groups.base_currency"
+        ") AS converted WHERE settlements.id = converted.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('settlements', 'base_amount_cents')
+    op.drop_column('expense_splits', 'base_amount_cents')
+    op.drop_column('expenses', 'base_amount_cents')
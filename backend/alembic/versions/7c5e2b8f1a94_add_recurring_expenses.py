@@ -0,0 +1,48 @@
+"""Add_recurring_expenses
+
+Revision ID: 7c5e2b8f1a94
+Revises: e1b7d4a9c362
+Create Date: 2026-10-17 16:48:33.072915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c5e2b8f1a94'
+down_revision: Union[str, None] = 'e1b7d4a9c362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('recurring_expenses',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('group_id', sa.UUID(), nullable=True),
+    sa.Column('paid_by_id', sa.UUID(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('split', sa.JSON(), nullable=False),
+    sa.Column('frequency', sa.String(), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=True),
+    sa.Column('occurrences', sa.Integer(), nullable=False),
+    sa.Column('next_run', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['paid_by_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_recurring_expenses_group_id'), 'recurring_expenses', ['group_id'], unique=False)
+    op.create_index(op.f('ix_recurring_expenses_next_run'), 'recurring_expenses', ['next_run'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_recurring_expenses_next_run'), table_name='recurring_expenses')
+    op.drop_index(op.f('ix_recurring_expenses_group_id'), table_name='recurring_expenses')
+    op.drop_table('recurring_expenses')
@@ -0,0 +1,45 @@
+"""Store_amounts_as_integer_cents
+
+Revision ID: 8f3a2c6d9b10
+Revises: 5b7e9c1d2a43
+Create Date: 2026-10-17 11:04:52.730115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a2c6d9b10'
+down_revision: Union[str, None] = '5b7e9c1d2a43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, float column, cents column)
+MONEY_COLUMNS = [
+    ('expenses', 'amount', 'amount_cents'),
+    ('expense_splits', 'amount', 'amount_cents'),
+    ('settlements', 'amount', 'amount_cents'),
+    ('group_member_balances', 'balance', 'balance_cents'),
+]
+
+
+def upgrade() -> None:
+    for table, float_column, cents_column in MONEY_COLUMNS:
+        op.add_column(table, sa.Column(cents_column, sa.BigInteger(), nullable=True))
+        op.execute(
+            f"UPDATE {table} SET {cents_column} = "
+            f"CAST(ROUND(CAST({float_column} AS numeric) * 100) AS BIGINT)"
+        )
+        op.alter_column(table, cents_column, existing_type=sa.BigInteger(), nullable=False)
+        op.drop_column(table, float_column)
+
+
+def downgrade() -> None:
+    for table, float_column, cents_column in MONEY_COLUMNS:
+        op.add_column(table, sa.Column(float_column, sa.Float(), nullable=True))
+        op.execute(f"UPDATE {table} SET {float_column} = {cents_column} / 100.0")
+        op.alter_column(table, float_column, existing_type=sa.Float(), nullable=False)
+        op.drop_column(table, cents_column)
@@ -0,0 +1,52 @@
+"""Index_foreign_keys
+
+Revision ID: 9b4e6d2f8c15
+Revises: e5b1d7c3a920
+Create Date: 2026-10-17 21:04:38.219563
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e6d2f8c15'
+down_revision: Union[str, None] = 'e5b1d7c3a920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# expenses.group_id is already the leading column of ix_expenses_group_id_date_id
+FOREIGN_KEY_INDEXES = [
+    ('expenses', 'paid_by_id'),
+    ('expense_splits', 'expense_id'),
+    ('expense_splits', 'user_id'),
+    ('settlements', 'group_id'),
+    ('settlements', 'paid_by_id'),
+    ('settlements', 'paid_to_id'),
+    ('group_members', 'user_id'),
+]
+
+
+def upgrade() -> None:
+    for table, column in FOREIGN_KEY_INDEXES:
+        op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False)
+
+    # The unique constraint becomes the primary key; rows without a group or
+    # user never were memberships
+    op.execute("DELETE FROM group_members WHERE group_id IS NULL OR user_id IS NULL")
+    op.drop_constraint('uq_group_members_group_id_user_id', 'group_members', type_='unique')
+    op.alter_column('group_members', 'group_id', existing_type=sa.UUID(), nullable=False)
+    op.alter_column('group_members', 'user_id', existing_type=sa.UUID(), nullable=False)
+    op.create_primary_key('group_members_pkey', 'group_members', ['group_id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('group_members_pkey', 'group_members', type_='primary')
+    op.alter_column('group_members', 'user_id', existing_type=sa.UUID(), nullable=True)
+    op.alter_column('group_members', 'group_id', existing_type=sa.UUID(), nullable=True)
+    op.create_unique_constraint('uq_group_members_group_id_user_id', 'group_members', ['group_id', 'user_id'])
+
+    for table, column in reversed(FOREIGN_KEY_INDEXES):
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
@@ -0,0 +1,38 @@
+"""Add_currencies_and_fx_rates
+
+Revision ID: a3e8c1f6d592
+Revises: f2c6a9d4b871
+Create Date: 2026-10-17 19:25:51.203846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3e8c1f6d592'
+down_revision: Union[str, None] = 'f2c6a9d4b871'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing amounts were all recorded in the default currency
+    op.add_column('groups', sa.Column('base_currency', sa.String(length=3), server_default='USD', nullable=False))
+    op.add_column('expenses', sa.Column('currency', sa.String(length=3), server_default='USD', nullable=False))
+    op.add_column('settlements', sa.Column('currency', sa.String(length=3), server_default='USD', nullable=False))
+    op.create_table('fx_rates',
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=18, scale=8), nullable=False),
+    sa.PrimaryKeyConstraint('currency', 'date')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fx_rates')
+    op.drop_column('settlements', 'currency')
+    op.drop_column('expenses', 'currency')
+    op.drop_column('groups', 'base_currency')
@@ -0,0 +1,26 @@
+"""Add_group_version
+
+Revision ID: a6c2e8f1b5d3
+Revises: 3d1f6a8e4c27
+Create Date: 2026-10-17 15:22:47.903614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e8f1b5d3'
+down_revision: Union[str, None] = '3d1f6a8e4c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('groups', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('groups', 'version')
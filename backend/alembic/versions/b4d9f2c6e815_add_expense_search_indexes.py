@@ -0,0 +1,36 @@
+"""Add_expense_search_indexes
+
+Revision ID: b4d9f2c6e815
+Revises: 7c5e2b8f1a94
+Create Date: 2026-10-17 17:26:40.551208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d9f2c6e815'
+down_revision: Union[str, None] = '7c5e2b8f1a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Must match the expressions used by utils.search
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX ix_expenses_description_trgm ON expenses "
+        "USING gin (description gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_expenses_description_tsv ON expenses "
+        "USING gin (to_tsvector('simple', coalesce(description, '')))"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_expenses_description_tsv")
+    op.execute("DROP INDEX IF EXISTS ix_expenses_description_trgm")
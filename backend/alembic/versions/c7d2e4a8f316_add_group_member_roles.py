@@ -0,0 +1,34 @@
+"""Add_group_member_roles
+
+Revision ID: c7d2e4a8f316
+Revises: a3e8c1f6d592
+Create Date: 2026-10-17 20:03:38.950172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e4a8f316'
+down_revision: Union[str, None] = 'a3e8c1f6d592'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('group_members', sa.Column('role', sa.String(), server_default='member', nullable=False))
+    # The creator used to be recognized as the group's first member row
+    op.execute(
+        "UPDATE group_members SET role = 'admin' "
+        "FROM (SELECT DISTINCT ON (group_id) group_id, user_id FROM group_members "
+        "ORDER BY group_id, ctid) AS creators "
+        "WHERE group_members.group_id = creators.group_id "
+        "AND group_members.user_id = creators.user_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('group_members', 'role')
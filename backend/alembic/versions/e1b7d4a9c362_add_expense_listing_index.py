@@ -0,0 +1,26 @@
+"""Add_expense_listing_index
+
+Revision ID: e1b7d4a9c362
+Revises: a6c2e8f1b5d3
+Create Date: 2026-10-17 16:05:12.418530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b7d4a9c362'
+down_revision: Union[str, None] = 'a6c2e8f1b5d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_expenses_group_id_date_id', 'expenses', ['group_id', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expenses_group_id_date_id', table_name='expenses')
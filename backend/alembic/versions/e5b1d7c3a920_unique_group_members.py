@@ -0,0 +1,32 @@
+"""Unique_group_members
+
+Revision ID: e5b1d7c3a920
+Revises: c7d2e4a8f316
+Create Date: 2026-10-17 20:31:12.447015
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1d7c3a920'
+down_revision: Union[str, None] = 'c7d2e4a8f316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Drop duplicate memberships, keeping the oldest row (and so the admin)
+    op.execute(
+        "DELETE FROM group_members AS duplicate USING group_members AS kept "
+        "WHERE duplicate.group_id = kept.group_id AND duplicate.user_id = kept.user_id "
+        "AND duplicate.ctid > kept.ctid"
+    )
+    op.create_unique_constraint('uq_group_members_group_id_user_id', 'group_members', ['group_id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_group_members_group_id_user_id', 'group_members', type_='unique')
@@ -0,0 +1,52 @@
+"""Add_expense_categories_and_rollups
+
+Revision ID: f2c6a9d4b871
+Revises: d8a3f5c7e219
+Create Date: 2026-10-17 18:41:07.662930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a9d4b871'
+down_revision: Union[str, None] = 'd8a3f5c7e219'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('expenses', sa.Column('category', sa.String(), server_default='uncategorized', nullable=False))
+    op.add_column('recurring_expenses', sa.Column('category', sa.String(), server_default='uncategorized', nullable=False))
+    op.create_table('expense_rollups',
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('paid_by_id', sa.UUID(), nullable=False),
+    sa.Column('total_cents', sa.BigInteger(), nullable=False),
+    sa.Column('expense_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['paid_by_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('group_id', 'month', 'category', 'paid_by_id')
+    )
+    # Backfill from the existing expenses; scripts/rebuild_rollups.py does the
+    # same per group
+    op.execute(
+        "INSERT INTO expense_rollups "
+        "(group_id, month, category, paid_by_id, total_cents, expense_count, updated_at) "
+        "SELECT group_id, date_trunc('month', date)::date, category, paid_by_id, "
+        "sum(amount_cents), count(*), now() "
+        "FROM expenses "
+        "WHERE group_id IS NOT NULL AND paid_by_id IS NOT NULL AND date IS NOT NULL "
+        "GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('expense_rollups')
+    op.drop_column('recurring_expenses', 'category')
+    op.drop_column('expenses', 'category')
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import UUID
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -7,6 +8,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import models
 from database import get_db
+from utils.membership import member_role
 
 # Configuration
 SECRET_KEY = "your-secret-key-here"  # Change this in production!
@@ -55,3 +57,17 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+def require_group_member(
+    group_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+) -> str:
+    """
+    Dependency for routes under a {group_id} path: the current user's role
+    in the group, 404 if they are not a member (or the group does not exist).
+    """
+    role = member_role(db, group_id, current_user.id)
+    if role is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return role
@@ -0,0 +1,43 @@
+"""
+Times the settlement planners on synthetic groups.
+
+    python benchmarks/bench_settlement_planner.py
+"""
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path to import from parent
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.settlement_planner import plan_exact, plan_greedy
+
+GREEDY_SIZES = [10, 100, 1000, 10000]
+EXACT_SIZES = [10, 12, 16, 20]
+
+def random_balances(rng, members):
+    amounts = {i: rng.randint(-50000, 50000) for i in range(members - 1)}
+    amounts[members - 1] = -sum(amounts.values())
+    return amounts
+
+def bench(planner, amounts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        transfers = planner(amounts)
+        best = min(best, time.perf_counter() - start)
+    return best, len(transfers)
+
+def main():
+    rng = random.Random(0)
+    print(f"{'planner':<8} {'members':>8} {'transfers':>10} {'best ms':>10}")
+    for members in GREEDY_SIZES:
+        elapsed, transfers = bench(plan_greedy, random_balances(rng, members), repeat=5)
+        print(f"{'greedy':<8} {members:>8} {transfers:>10} {elapsed * 1000:>10.2f}")
+    for members in EXACT_SIZES:
+        elapsed, transfers = bench(plan_exact, random_balances(rng, members), repeat=1)
+        print(f"{'exact':<8} {members:>8} {transfers:>10} {elapsed * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import GROUP_SCALES
+from utils.balances import settlement_summary_cache
+from utils.cache import LRUCacheBackend
+
+scales = pytest.mark.parametrize("scale", GROUP_SCALES, ids=lambda s: f"{s[0]}m-{s[1]}e")
+
+def clear_summary_cache():
+    settlement_summary_cache.backend = LRUCacheBackend()
+
+def ok(response):
+    assert response.status_code == 200, response.text
+    return response
+
+@scales
+def test_get_balances_cold(measure, client, seeded, scale):
+    group_id, _ = seeded[1][scale]
+    measure(lambda: ok(client.get(f"/groups/{group_id}/expenses/balances")), setup=clear_summary_cache)
+
+@scales
+def test_get_balances_cached(measure, client, seeded, scale):
+    group_id, _ = seeded[1][scale]
+    url = f"/groups/{group_id}/expenses/balances"
+    ok(client.get(url))  # Populate the cache
+    measure(lambda: ok(client.get(url)))
+
+@scales
+def test_get_group_balances_cold(measure, client, seeded, scale):
+    group_id, _ = seeded[1][scale]
+    measure(lambda: ok(client.get(f"/settlements/group/{group_id}/balances")), setup=clear_summary_cache)
+
+@scales
+def test_read_expenses(measure, client, seeded, scale):
+    group_id, _ = seeded[1][scale]
+    measure(lambda: ok(client.get(f"/groups/{group_id}/expenses/")))
+
+def test_read_groups(measure, client):
+    measure(lambda: ok(client.get("/groups/")))
+
+@scales
+def test_create_expense(measure, client, seeded, scale):
+    group_id, member_ids = seeded[1][scale]
+    participants = member_ids[:4]
+    payload = {
+        "amount": 10.0 * len(participants),
+        "description": "Benchmark expense",
+        "group_id": str(group_id),
+        "paid_by_id": str(member_ids[0]),
+        "splits": [{"user_id": str(user_id), "amount": 10.0} for user_id in participants]
+    }
+    measure(lambda: ok(client.post(f"/groups/{group_id}/expenses/", json=payload)))
@@ -4,11 +4,14 @@ from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from contextlib import asynccontextmanager, suppress
 from datetime import timedelta
 from pathlib import Path
 from config import get_settings
+import asyncio
 import uvicorn
 import logging
+import os
 import sys
 
 # Configure logging
@@ -32,11 +35,30 @@ import routers.expenses as expenses
 import routers.oauth as oauth
 import routers.auth as auth_router
 import routers.settlements as settlements
+import routers.recurring_expenses as recurring_expenses
+import routers.analytics as analytics
+from utils.balances import settlement_summary_cache, user_position_cache
+from utils.membership import membership_cache
+from utils.recurring import run_recurring_worker
 
 # Create tables
 models.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI(title="Expense Splitter API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Materialize recurring expenses in the background; several workers or
+    # replicas can run it at once since due templates are locked SKIP LOCKED
+    worker = None
+    if os.getenv("RECURRING_WORKER_ENABLED", "1") == "1":
+        poll_seconds = float(os.getenv("RECURRING_WORKER_POLL_SECONDS", "60"))
+        worker = asyncio.create_task(run_recurring_worker(database.SessionLocal, poll_seconds))
+    yield
+    if worker:
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
+
+app = FastAPI(title="Expense Splitter API", lifespan=lifespan)
 
 settings = get_settings()
 
@@ -67,6 +89,8 @@ app.include_router(groups.router)
 app.include_router(expenses.router)
 app.include_router(oauth.router)
 app.include_router(settlements.router)
+app.include_router(recurring_expenses.router)
+app.include_router(analytics.router)
 
 @app.post("/token")
 async def login_for_access_token(
@@ -124,6 +148,14 @@ def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "settlement_summaries": settlement_summary_cache.stats(),
+        "user_positions": user_position_cache.stats(),
+        "memberships": membership_cache.stats()
+    }
+
 @app.get("/test-db")
 async def test_db(db: Session = Depends(database.get_db)):
     try:
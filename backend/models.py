@@ -1,16 +1,27 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String, Float, DateTime, Text, Table
+from sqlalchemy import BigInteger, Boolean, Column, DDL, Date, ForeignKey, Index, Integer, Numeric, String, DateTime, Text, Table, JSON, PrimaryKeyConstraint, UniqueConstraint, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
 from database import Base
 
+# ISO 4217 code of groups created without one, and of amounts recorded
+# before currencies were
+DEFAULT_CURRENCY = "USD"
+
+# Roles of group members; the creator is the group's admin
+GROUP_ROLE_ADMIN = "admin"
+GROUP_ROLE_MEMBER = "member"
+
 # Association table for group members
 group_members = Table(
     'group_members',
     Base.metadata,
-    Column('user_id', UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE')),
+    Column('user_id', UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), index=True),
     Column('group_id', UUID(as_uuid=True), ForeignKey('groups.id', ondelete='CASCADE')),
+    Column('role', String, nullable=False, default=GROUP_ROLE_MEMBER, server_default=GROUP_ROLE_MEMBER),
+    # Group first, so it also serves the lookups of a group's members
+    PrimaryKeyConstraint('group_id', 'user_id', name='group_members_pkey'),
     extend_existing=True
 )
 
@@ -39,6 +50,12 @@ class Group(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
+    # Currency balances are kept and settled in; expenses and settlements in
+    # other currencies are converted into it
+    base_currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    # Bumped by every write that changes the group's expenses, settlements or
+    # members; cached balance summaries are keyed on it
+    version = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -46,20 +63,34 @@ class Group(Base):
     expenses = relationship("Expense", back_populates="group", cascade="all, delete-orphan")
     members = relationship("User", secondary=group_members, back_populates="groups")
     settlements = relationship("Settlement", back_populates="group", cascade="all, delete-orphan")
+    member_balances = relationship("GroupMemberBalance", back_populates="group", cascade="all, delete-orphan")
+    balance_checkpoints = relationship("BalanceCheckpoint", back_populates="group", cascade="all, delete-orphan")
+    recurring_expenses = relationship("RecurringExpense", back_populates="group", cascade="all, delete-orphan")
+    expense_rollups = relationship("ExpenseRollup", back_populates="group", cascade="all, delete-orphan")
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # Keyset pagination of a group's expenses by (date, id); also the
+        # index for every other lookup by group_id
+        Index("ix_expenses_group_id_date_id", "group_id", "date", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    # Amount in the group's base currency at the rate used when it was
+    # written; NULL when currency is the base currency
+    base_amount_cents = Column(BigInteger, nullable=True)
     description = Column(String)
+    category = Column(String, nullable=False, default="uncategorized", server_default="uncategorized")
     date = Column(DateTime, default=datetime.utcnow)
     receipt_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Foreign Keys
-    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'))
+    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), index=True)
     group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'))
 
     # Relationships
@@ -67,18 +98,38 @@ class Expense(Base):
     group = relationship("Group", back_populates="expenses")
     splits = relationship("ExpenseSplit", back_populates="expense", cascade="all, delete-orphan")
 
+# Expense search: Postgres uses trigram and tsvector GIN indexes on
+# description (created by migration); SQLite gets an FTS5 table holding its
+# own copy of each description, keyed by the expense id and kept in sync
+# with expenses by triggers (expenses has no stable integer key to use as
+# an external content rowid: VACUUM may renumber the implicit rowids)
+EXPENSE_FTS_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(expense_id UNINDEXED, description)",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expense_id, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN "
+    "DELETE FROM expenses_fts WHERE expense_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN "
+    "UPDATE expenses_fts SET description = new.description WHERE expense_id = old.id; END",
+]
+for statement in EXPENSE_FTS_SQLITE_DDL:
+    event.listen(Expense.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Expense.__table__, "before_drop", DDL("DROP TABLE IF EXISTS expenses_fts").execute_if(dialect="sqlite"))
+
 class ExpenseSplit(Base):
     __tablename__ = "expense_splits"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    # Share in the group's base currency, like Expense.base_amount_cents
+    base_amount_cents = Column(BigInteger, nullable=True)
     is_settled = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Foreign Keys
-    expense_id = Column(UUID(as_uuid=True), ForeignKey("expenses.id", ondelete='CASCADE'))
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'))
+    expense_id = Column(UUID(as_uuid=True), ForeignKey("expenses.id", ondelete='CASCADE'), index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), index=True)
 
     # Relationships
     expense = relationship("Expense", back_populates="splits")
@@ -88,16 +139,116 @@ class Settlement(Base):
     __tablename__ = "settlements"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    # Amount in the group's base currency, like Expense.base_amount_cents
+    base_amount_cents = Column(BigInteger, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Foreign Keys
-    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'))
-    paid_to_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'))
-    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'))
+    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), index=True)
+    paid_to_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), index=True)
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'), index=True)
 
     # Relationships
     paid_by = relationship("User", foreign_keys=[paid_by_id], back_populates="settlements_paid")
     paid_to = relationship("User", foreign_keys=[paid_to_id], back_populates="settlements_received")
     group = relationship("Group", back_populates="settlements")
+
+class GroupMemberBalance(Base):
+    __tablename__ = "group_member_balances"
+
+    # Net balance of a member within a group, kept in step with every expense
+    # and settlement write so reads never have to replay the group's history.
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), primary_key=True)
+    balance_cents = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    group = relationship("Group", back_populates="member_balances")
+    user = relationship("User")
+
+class BalanceCheckpoint(Base):
+    __tablename__ = "balance_checkpoints"
+
+    # Snapshot of a group's balances covering every expense and settlement
+    # created up to covered_until; balance computation replays only newer ones.
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'), index=True)
+    balances = Column(JSON, nullable=False)  # {user_id: balance in cents}
+    covered_until = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    group = relationship("Group", back_populates="balance_checkpoints")
+
+class RecurringExpense(Base):
+    __tablename__ = "recurring_expenses"
+
+    # Template materialized into an expense at every occurrence of its
+    # schedule; next_run is the next occurrence, or None once the schedule
+    # has ended.
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'), index=True)
+    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'))
+    description = Column(String)
+    amount_cents = Column(BigInteger, nullable=False)
+    category = Column(String, nullable=False, default="uncategorized", server_default="uncategorized")
+    split = Column(JSON, nullable=False)  # schemas.SplitSpec
+    frequency = Column(String, nullable=False)  # daily, weekly, monthly or yearly
+    interval = Column(Integer, nullable=False, default=1)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=True)
+    occurrences = Column(Integer, nullable=False, default=0)
+    next_run = Column(DateTime, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    group = relationship("Group", back_populates="recurring_expenses")
+
+class ExpenseRollup(Base):
+    __tablename__ = "expense_rollups"
+
+    # Spend per group, month, category and payer, kept in step with every
+    # expense write so analytics never aggregate the expenses themselves.
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete='CASCADE'), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    category = Column(String, primary_key=True)
+    paid_by_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), primary_key=True)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    expense_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    group = relationship("Group", back_populates="expense_rollups")
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+
+    # Daily exchange rate: units of currency per unit of the reference
+    # currency (utils.fx.FX_REFERENCE_CURRENCY)
+    currency = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Numeric(18, 8), nullable=False)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Concurrent requests with the same key race on this constraint
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+    )
+
+    # Response of a create request sent with an Idempotency-Key header,
+    # returned as is when the client retries with the same key until
+    # expires_at.
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+from uuid import UUID
+from datetime import date
+
+import database
+import auth
+import schemas
+from utils.analytics import read_group_analytics
+
+router = APIRouter(
+    prefix="/groups/{group_id}/analytics",
+    tags=["analytics"],
+    dependencies=[Depends(auth.require_group_member)]
+)
+
+@router.get("", response_model=schemas.GroupAnalytics)
+def get_group_analytics(
+    group_id: UUID,
+    start_month: Optional[date] = None,
+    end_month: Optional[date] = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Monthly spend of the group per category and payer, read from the
+    spending rollup; start_month and end_month are inclusive, any day of
+    the month selects the whole month.
+    """
+    return read_group_analytics(db, group_id, start_month, end_month)
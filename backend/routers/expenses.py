@@ -1,238 +1,428 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, Header, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional, Dict
 from uuid import UUID
+import json
 import schemas
 import models
 from database import get_db
-from auth import get_current_active_user
+from auth import get_current_active_user, require_group_member
 from datetime import datetime
 from utils.s3 import upload_file_to_s3, delete_file_from_s3
+from utils.expense_export import iter_csv, iter_export_rows, iter_ndjson
+from utils.expenses import ExpenseConflictError, expense_shares, group_member_ids, insert_expenses, update_expense
+from utils.idempotency import (
+    IDEMPOTENCY_KEY_MAX_LENGTH, IdempotencyKeyInProgressError, IdempotencyKeyReusedError,
+    begin_idempotent_request, purge_expired_idempotency_keys, request_fingerprint, store_idempotent_response
+)
+from utils.pagination import decode_expense_cursor, encode_cursor
+from utils.search import decode_search_cursor, search_expenses
+from utils.statement_import import CHARGE_SIGNS, CHARGES_NEGATIVE, chunked, iter_statement_transactions, to_expenses
+from utils.analytics import apply_rollup_deltas, rollup_deltas
+from utils.fx import base_cents, group_converter
+from utils.splits import SplitShare
+from utils.balances import (
+    read_settlement_summary, apply_balance_deltas, expense_deltas, invalidate_user_positions,
+    create_checkpoint_if_due, invalidate_checkpoints, bump_group_version
+)
 
+# Every route is scoped to a group the current user is a member of
 router = APIRouter(
     prefix="/groups/{group_id}/expenses",
-    tags=["expenses"]
+    tags=["expenses"],
+    dependencies=[Depends(require_group_member)]
 )
 
+# Largest number of expenses accepted by one bulk request
+BULK_MAX_EXPENSES = 1000
+
+# Statement rows inserted and committed together by the import endpoint
+IMPORT_BATCH_SIZE = 500
+
+# Loader options per endpoint: everything schemas.Expense serializes is loaded
+# up front, so a response costs the same number of queries for any page size
+EXPENSE_LIST_OPTIONS = (selectinload(models.Expense.splits),)
+EXPENSE_DETAIL_OPTIONS = (selectinload(models.Expense.splits),)
+
 # First, define routes without expense_id parameter
 @router.get("/", response_model=List[schemas.Expense])
 def read_expenses(
     group_id: UUID,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    paid_by_id: Optional[UUID] = None,
+    db: Session = Depends(get_db)
 ):
-    # Verify group exists and user is a member
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
-    expenses = db.query(models.Expense).filter(
+    """
+    Expenses of the group, newest first, optionally within [start_date,
+    end_date) and paid by paid_by_id. Pages are keyset paginated on (date,
+    id): when more expenses follow, the X-Next-Cursor response header holds
+    the cursor to pass back for the next page.
+    """
+    query = db.query(models.Expense).options(*EXPENSE_LIST_OPTIONS).filter(
         models.Expense.group_id == group_id
-    ).offset(skip).limit(limit).all()
+    )
+    if start_date:
+        query = query.filter(models.Expense.date >= start_date)
+    if end_date:
+        query = query.filter(models.Expense.date < end_date)
+    if paid_by_id:
+        query = query.filter(models.Expense.paid_by_id == paid_by_id)
+    if cursor:
+        try:
+            after = decode_expense_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(models.Expense.date, models.Expense.id) < after)
+
+    # One extra row tells whether another page follows
+    expenses = query.order_by(
+        models.Expense.date.desc(),
+        models.Expense.id.desc()
+    ).limit(limit + 1).all()
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        last = expenses[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.date.isoformat(), str(last.id)])
     return expenses
 
+@router.get("/export")
+def export_expenses(
+    group_id: UUID,
+    format: str = "csv",
+    db: Session = Depends(get_db)
+):
+    if format == "csv":
+        encode, media_type = iter_csv, "text/csv"
+    elif format == "ndjson":
+        encode, media_type = iter_ndjson, "application/x-ndjson"
+    else:
+        raise HTTPException(status_code=400, detail="Export format must be csv or ndjson")
+
+    # Streamed in its own session: the request's one is not meant to outlive
+    # the endpoint
+    bind = db.get_bind()
+
+    def body():
+        export_db = Session(bind=bind)
+        try:
+            yield from encode(iter_export_rows(export_db, group_id))
+        finally:
+            export_db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses-{group_id}.{format}"'}
+    )
+
+@router.get("/search", response_model=List[schemas.Expense])
+def search_group_expenses(
+    group_id: UUID,
+    response: Response,
+    q: str = Query(..., min_length=1),
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    Expenses whose description matches q, best match first, optionally
+    filtered by amount and date. Keyset paginated like the expense listing:
+    the X-Next-Cursor response header holds the next page's cursor.
+    """
+    try:
+        after = decode_search_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One extra row tells whether another page follows
+    rows = search_expenses(
+        db,
+        group_id,
+        q,
+        limit + 1,
+        min_amount_cents=schemas.to_cents(min_amount) if min_amount is not None else None,
+        max_amount_cents=schemas.to_cents(max_amount) if max_amount is not None else None,
+        start_date=start_date,
+        end_date=end_date,
+        after=after,
+        options=EXPENSE_LIST_OPTIONS
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, rank = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([rank, str(last.id)])
+    return [expense for expense, _ in rows]
+
 @router.get("/balances", response_model=schemas.GroupSettlementSummary)
 def get_balances(
     group_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    mode: Optional[str] = None,
+    db: Session = Depends(get_db)
 ):
-    # Verify group exists and user is a member
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
+    group = db.query(models.Group).filter(models.Group.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    # Initialize balances for all members
-    balances_dict = {str(member.id): 0.0 for member in group.members}
-    
-    # Calculate expenses
-    expenses = (
-        db.query(models.Expense)
-        .filter(models.Expense.group_id == group_id)
-        .all()
-    )
-    
-    for expense in expenses:
-        # Add the full amount to the person who paid
-        balances_dict[str(expense.paid_by_id)] += float(expense.amount)
-        
-        # Get all splits for this expense
-        splits = db.query(models.ExpenseSplit).filter(
-            models.ExpenseSplit.expense_id == expense.id
-        ).all()
-        
-        # Subtract each person's split amount
-        for split in splits:
-            balances_dict[str(split.user_id)] -= float(split.amount)
-    
-    # Calculate settlements
-    settlements = (
-        db.query(models.Settlement)
-        .filter(models.Settlement.group_id == group_id)
-        .all()
-    )
-    
-    for settlement in settlements:
-        # When someone pays a settlement, their balance increases (they've paid what they owed)
-        balances_dict[str(settlement.paid_by_id)] += float(settlement.amount)
-        # The person receiving the settlement has their balance decrease (they've been paid what they were owed)
-        balances_dict[str(settlement.paid_to_id)] -= float(settlement.amount)
-    
-    # Round balances to 2 decimal places to avoid floating point issues
-    balances_dict = {k: round(v, 2) for k, v in balances_dict.items()}
-    
-    # Convert balances dict to list of GroupBalances objects
-    balances = []
-    for member in group.members:
-        member_id = str(member.id)
-        balances.append({
-            "user_id": member.id,
-            "user_name": member.full_name,
-            "profile_picture_url": member.profile_picture_url,
-            "balance": balances_dict[member_id]
-        })
-    
-    # Calculate suggested settlements
-    suggested_settlements = []
-    debtors = [(str(b["user_id"]), b["balance"], b["user_name"]) 
-               for b in balances if b["balance"] < 0]
-    creditors = [(str(b["user_id"]), b["balance"], b["user_name"]) 
-                 for b in balances if b["balance"] > 0]
-    
-    # Sort by absolute amount to settle larger debts first
-    debtors.sort(key=lambda x: abs(x[1]), reverse=True)
-    creditors.sort(key=lambda x: x[1], reverse=True)
-    
-    while debtors and creditors:
-        debtor_id, debt, debtor_name = debtors[0]
-        creditor_id, credit, creditor_name = creditors[0]
-        
-        # Calculate settlement amount
-        amount = min(abs(debt), credit)
-        
-        if amount > 0.01:  # Only suggest settlements above 1 cent
-            suggested_settlements.append({
-                "paid_by_id": debtor_id,
-                "paid_by_name": debtor_name,
-                "paid_to_id": creditor_id,
-                "paid_to_name": creditor_name,
-                "amount": round(amount, 2)
-            })
-        
-        # Update remaining balances
-        new_debt = debt + amount
-        new_credit = credit - amount
-        
-        if abs(new_debt) < 0.01:  # Debt fully settled
-            debtors.pop(0)
-        else:
-            debtors[0] = (debtor_id, new_debt, debtor_name)
-            
-        if new_credit < 0.01:  # Credit fully used
-            creditors.pop(0)
-        else:
-            creditors[0] = (creditor_id, new_credit, creditor_name)
-    
-    return {
-        "balances": balances,
-        "suggested_settlements": suggested_settlements
-    }
+    # Member balances and suggested settlements, cached per group version
+    try:
+        return read_settlement_summary(db, group, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/", response_model=schemas.Expense)
 def create_expense(
     group_id: UUID,
     expense: schemas.ExpenseCreate,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    # Verify group exists and user is a member
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
-    # Verify all users in splits are group members
-    member_ids = {str(member.id) for member in group.members}
-    for split in expense.splits:
-        if str(split.user_id) not in member_ids:
-            raise HTTPException(
-                status_code=400,
-                detail=f"User {split.user_id} is not a member of the group"
-            )
+    # A retry with the same Idempotency-Key gets the stored response back
+    # without validating or writing anything again
+    fingerprint = request_fingerprint(f"POST /groups/{group_id}/expenses", expense)
+    try:
+        claim, replay = begin_idempotent_request(db, current_user.id, idempotency_key, fingerprint)
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyKeyInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replay is not None:
+        return replay
+
+    # Validate splits against the group members, expanding a split spec
+    member_ids = group_member_ids(db, group_id)
+    try:
+        shares = expense_shares(expense, member_ids, group_converter(db, group_id))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Validate split amounts sum up to total expense amount
-    total_split = sum(float(split.amount) for split in expense.splits)
-    if abs(total_split - float(expense.amount)) > 0.01:
+    # Create the expense and bulk insert its splits, updating member
+    # balances in the same transaction
+    try:
+        [expense_id] = insert_expenses(db, group_id, [(expense, shares)])
+        if claim is not None:
+            # Stored in the same transaction as the expense
+            store_idempotent_response(claim, schemas.Expense.model_validate(
+                db.query(models.Expense).options(*EXPENSE_DETAIL_OPTIONS).filter(
+                    models.Expense.id == expense_id
+                ).one()
+            ))
+            background_tasks.add_task(purge_expired_idempotency_keys, db.get_bind())
+        db.commit()
+        invalidate_user_positions(member_ids)
+        background_tasks.add_task(create_checkpoint_if_due, db.get_bind(), group_id)
+        return db.query(models.Expense).options(*EXPENSE_DETAIL_OPTIONS).filter(
+            models.Expense.id == expense_id
+        ).one()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/bulk", response_model=schemas.ExpenseBulkResult)
+def create_expenses_bulk(
+    group_id: UUID,
+    payload: schemas.ExpenseBulkCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    if len(payload.expenses) > BULK_MAX_EXPENSES:
         raise HTTPException(
             status_code=400,
-            detail="Split amounts must equal the total expense amount"
+            detail=f"At most {BULK_MAX_EXPENSES} expenses can be created per request"
         )
-    
-    # Create expense
-    db_expense = models.Expense(
-        amount=expense.amount,
-        description=expense.description,
-        paid_by_id=expense.paid_by_id,
-        group_id=group_id,
-        date=datetime.utcnow()
-    )
-    db.add(db_expense)
-    db.flush()  # Get the expense ID without committing
-    
-    # Create splits
-    for split in expense.splits:
-        db_split = models.ExpenseSplit(
-            expense_id=db_expense.id,
-            user_id=split.user_id,
-            amount=float(split.amount)  # Ensure amount is stored as float
+
+    # Validate every expense against one member set and rate table
+    member_ids = group_member_ids(db, group_id)
+    converter = group_converter(db, group_id)
+    results = []
+    valid = []
+    for index, expense in enumerate(payload.expenses):
+        try:
+            valid.append((expense, expense_shares(expense, member_ids, converter)))
+            results.append({"index": index, "status": "created"})
+        except ValueError as e:
+            results.append({"index": index, "status": "rejected", "error": str(e)})
+    rejected = len(payload.expenses) - len(valid)
+
+    if rejected and payload.mode == "atomic":
+        for result in results:
+            if result["status"] == "created":
+                result["status"] = "skipped"
+        raise HTTPException(
+            status_code=400,
+            detail={"created": 0, "rejected": rejected, "results": results}
         )
-        db.add(db_split)
-    
+
+    # Insert all valid expenses in one transaction
     try:
+        expense_ids = iter(insert_expenses(db, group_id, valid))
         db.commit()
-        db.refresh(db_expense)
-        return db_expense
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    if valid:
+        invalidate_user_positions(member_ids)
+        background_tasks.add_task(create_checkpoint_if_due, db.get_bind(), group_id)
+    for result in results:
+        if result["status"] == "created":
+            result["expense_id"] = next(expense_ids)
+
+    return {"created": len(valid), "rejected": rejected, "results": results}
+
+@router.post("/import")
+def import_statement(
+    group_id: UUID,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    charge_sign: str = CHARGES_NEGATIVE,
+    paid_by_id: Optional[UUID] = None,
+    split_among: Optional[List[UUID]] = Query(None),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Import a CSV or OFX bank statement as expenses paid by paid_by_id (the
+    current user by default), split equally between split_among (every
+    member by default). Only charges are imported: in a CSV amount column
+    they are negative unless charge_sign is "positive", and credits
+    (payments, refunds) are rejected rows. The file is parsed as a stream
+    and inserted in batches of batch_size rows, each committed on its own;
+    the response is NDJSON with one progress line per batch, listing the
+    rejected row numbers, and a final summary line.
+    """
+    statement_format = (format or (file.filename or "").rsplit(".", 1)[-1]).lower()
+    if statement_format not in ("csv", "ofx"):
+        raise HTTPException(status_code=400, detail="Statement format must be csv or ofx")
+    if charge_sign not in CHARGE_SIGNS:
+        raise HTTPException(status_code=400, detail="charge_sign must be negative or positive")
+
+    member_ids = group_member_ids(db, group_id)
+    paid_by_id = paid_by_id or current_user.id
+    split_among = split_among or list(member_ids)
+    if paid_by_id not in member_ids or not set(split_among) <= member_ids:
+        raise HTTPException(status_code=400, detail="Payer and split users must be group members")
+
+    rows = to_expenses(
+        iter_statement_transactions(file.file, statement_format, charge_sign),
+        group_id,
+        paid_by_id,
+        split_among
+    )
+
+    # Batches are written through a session of their own, closed with the
+    # stream, rather than the request's
+    bind = db.get_bind()
+
+    def events():
+        import_db = Session(bind=bind)
+        totals = {"rows": 0, "created": 0, "rejected": 0}
+        try:
+            for batch in chunked(rows, batch_size):
+                valid = []
+                rejected_rows = []
+                for row_number, expense, error in batch:
+                    if error:
+                        rejected_rows.append({"row": row_number, "error": error})
+                        continue
+                    try:
+                        valid.append((expense, expense_shares(expense, member_ids)))
+                    except ValueError as e:
+                        rejected_rows.append({"row": row_number, "error": str(e)})
+
+                insert_expenses(import_db, group_id, valid)
+                import_db.commit()
+                if valid:
+                    invalidate_user_positions(member_ids)
+
+                totals["rows"] += len(batch)
+                totals["created"] += len(valid)
+                totals["rejected"] += len(rejected_rows)
+                yield json.dumps({"event": "progress", **totals, "rejected_rows": rejected_rows}) + "\n"
+        except Exception as e:
+            import_db.rollback()
+            yield json.dumps({"event": "error", **totals, "detail": str(e)}) + "\n"
+            return
+        finally:
+            import_db.close()
+
+        yield json.dumps({"event": "done", **totals}) + "\n"
+
+    # Runs once the whole statement has been streamed
+    background_tasks.add_task(create_checkpoint_if_due, bind, group_id)
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 # Then, define routes with expense_id parameter
 @router.get("/{expense_id}", response_model=schemas.Expense)
 def get_expense_details(
     group_id: UUID,
     expense_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    db: Session = Depends(get_db)
 ):
-    expense = db.query(models.Expense).filter(
+    expense = db.query(models.Expense).options(*EXPENSE_DETAIL_OPTIONS).filter(
         models.Expense.id == expense_id,
         models.Expense.group_id == group_id
     ).first()
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
-    
-    # Verify user is a member of the group
-    if current_user.id not in [member.id for member in expense.group.members]:
-        raise HTTPException(status_code=403, detail="Not a member of this group")
-    
     return expense
 
+@router.patch("/{expense_id}", response_model=schemas.Expense)
+def patch_expense(
+    group_id: UUID,
+    expense_id: UUID,
+    changes: schemas.ExpenseUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Partially update an expense in place. Only changed split rows are
+    written and member balances move by the net difference; the receipt is
+    kept. Fails with 409 when the expense changed since it was read.
+    """
+    expense = db.query(models.Expense).options(*EXPENSE_DETAIL_OPTIONS).filter(
+        models.Expense.id == expense_id,
+        models.Expense.group_id == group_id
+    ).first()
+    if not expense:
+        raise HTTPException(status_code=404, detail="Expense not found")
+
+    member_ids = group_member_ids(db, group_id)
+    try:
+        update_expense(db, expense, changes, member_ids)
+        db.commit()
+    except ExpenseConflictError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Expense was modified by another request")
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    invalidate_user_positions(member_ids)
+    background_tasks.add_task(create_checkpoint_if_due, db.get_bind(), group_id)
+    db.expire_all()
+    return db.query(models.Expense).options(*EXPENSE_DETAIL_OPTIONS).filter(
+        models.Expense.id == expense_id
+    ).one()
+
 @router.post("/{expense_id}/receipt", response_model=schemas.Expense)
 async def upload_receipt(
     group_id: UUID,
     expense_id: UUID,
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     # Verify expense exists and user has access
@@ -243,10 +433,6 @@ async def upload_receipt(
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    # Verify user is a member of the group
-    if current_user.id not in [member.id for member in expense.group.members]:
-        raise HTTPException(status_code=403, detail="Not a member of this group")
-    
     try:
         # Read file content
         content = await file.read()
@@ -264,6 +450,7 @@ async def upload_receipt(
         # Update expense with receipt URL
         expense.receipt_url = receipt_url
         expense.updated_at = datetime.utcnow()
+        bump_group_version(db, group_id)
         db.commit()
         db.refresh(expense)
         
@@ -278,7 +465,8 @@ async def delete_expense(
     group_id: UUID,
     expense_id: UUID,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: models.User = Depends(get_current_active_user),
+    role: str = Depends(require_group_member)
 ):
     # Verify expense exists and user has access
     expense = db.query(models.Expense).filter(
@@ -289,21 +477,39 @@ async def delete_expense(
         raise HTTPException(status_code=404, detail="Expense not found")
     
     # Verify user is either the one who paid or a group admin
-    if expense.paid_by_id != current_user.id and current_user.id != expense.group.members[0].id:
+    if expense.paid_by_id != current_user.id and role != models.GROUP_ROLE_ADMIN:
         raise HTTPException(
             status_code=403,
             detail="Only the expense creator or group admin can delete expenses"
         )
     
-    # Delete receipt from S3 if exists
-    if expense.receipt_url:
-        try:
-            delete_file_from_s3(expense.receipt_url)
-        except:
-            pass  # Ignore if file doesn't exist
+    # Reverse the expense's effect on member balances, with the base
+    # currency amounts stored when it was written
+    amount_cents = base_cents(expense)
+    shares = [SplitShare(split.user_id, base_cents(split)) for split in expense.splits]
+    apply_balance_deltas(
+        db,
+        group_id,
+        expense_deltas(expense.paid_by_id, amount_cents, shares, sign=-1)
+    )
+    invalidate_checkpoints(db, group_id, expense.created_at)
+    apply_rollup_deltas(db, group_id, rollup_deltas(
+        [(expense.paid_by_id, amount_cents, expense.category, expense.date)], sign=-1
+    ))
+    bump_group_version(db, group_id)
     
     # Delete expense (cascade will handle splits)
+    member_ids = group_member_ids(db, group_id)
+    receipt_url = expense.receipt_url
     db.delete(expense)
     db.commit()
+    invalidate_user_positions(member_ids)
+
+    # Delete receipt from S3 only once the expense is gone
+    if receipt_url:
+        try:
+            delete_file_from_s3(receipt_url)
+        except:
+            pass  # Ignore if file doesn't exist
     
     return {"message": "Expense deleted successfully"}
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 from uuid import UUID
 import schemas
 import models
 from database import get_db
-from auth import get_current_active_user
+from auth import get_current_active_user, require_group_member
+from utils.balances import invalidate_user_positions, bump_group_version
+from utils.expenses import group_member_ids
+from utils.membership import add_group_members, invalidate_memberships, member_role
 
 router = APIRouter(prefix="/groups", tags=["groups"])
 
@@ -17,11 +21,14 @@ def create_group(
 ):
     db_group = models.Group(**group.dict())
     db.add(db_group)
-    db.commit()
-    db.refresh(db_group)
+    db.flush()
     
-    # Add the creator as a member after the group is created
-    db_group.members.append(current_user)
+    # The creator is the group's admin
+    db.execute(insert(models.group_members).values(
+        group_id=db_group.id,
+        user_id=current_user.id,
+        role=models.GROUP_ROLE_ADMIN
+    ))
     db.commit()
     db.refresh(db_group)
     return db_group
@@ -33,20 +40,82 @@ def read_groups(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
+    # Members of every group in one extra query
+    member_of = select(models.group_members.c.group_id).where(
+        models.group_members.c.user_id == current_user.id
+    )
     groups = db.query(models.Group).filter(
-        models.Group.members.any(id=current_user.id)
-    ).offset(skip).limit(limit).all()
+        models.Group.id.in_(member_of)
+    ).options(
+        selectinload(models.Group.members)
+    ).order_by(models.Group.created_at, models.Group.id).offset(skip).limit(limit).all()
     return groups
 
+@router.get("/summary", response_model=List[schemas.GroupSummary])
+def read_group_summaries(
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    The current user's groups without their members: member count, last
+    activity and the user's balance, from one query with aggregate
+    subqueries.
+    """
+    member_count = select(func.count()).where(
+        models.group_members.c.group_id == models.Group.id
+    ).correlate(models.Group).scalar_subquery()
+    last_expense = select(func.max(models.Expense.created_at)).where(
+        models.Expense.group_id == models.Group.id
+    ).correlate(models.Group).scalar_subquery()
+    last_settlement = select(func.max(models.Settlement.created_at)).where(
+        models.Settlement.group_id == models.Group.id
+    ).correlate(models.Group).scalar_subquery()
+    member_of = select(models.group_members.c.group_id).where(
+        models.group_members.c.user_id == current_user.id
+    )
+
+    rows = db.query(
+        models.Group,
+        member_count.label("member_count"),
+        last_expense.label("last_expense"),
+        last_settlement.label("last_settlement"),
+        models.GroupMemberBalance.balance_cents
+    ).outerjoin(
+        models.GroupMemberBalance,
+        and_(
+            models.GroupMemberBalance.group_id == models.Group.id,
+            models.GroupMemberBalance.user_id == current_user.id
+        )
+    ).filter(
+        models.Group.id.in_(member_of)
+    ).order_by(models.Group.created_at, models.Group.id).offset(skip).limit(limit).all()
+
+    return [
+        {
+            "id": group.id,
+            "name": group.name,
+            "description": group.description,
+            "base_currency": group.base_currency,
+            "member_count": member_count,
+            "last_activity": max(
+                (value for value in (group.updated_at, last_expense, last_settlement) if value is not None),
+                default=None
+            ),
+            "balance_cents": balance_cents or 0
+        }
+        for group, member_count, last_expense, last_settlement, balance_cents in rows
+    ]
+
 @router.get("/{group_id}", response_model=schemas.Group)
 def read_group(
     group_id: UUID,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    role: str = Depends(require_group_member)
 ):
     group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
+        models.Group.id == group_id
     ).options(
         joinedload(models.Group.members)
     ).first()
@@ -55,52 +124,95 @@ def read_group(
         raise HTTPException(status_code=404, detail="Group not found")
     return group
 
+@router.post("/{group_id}/members/bulk", response_model=schemas.GroupMembersBulkResult)
+def add_members_bulk(
+    group_id: UUID,
+    payload: schemas.GroupMembersBulkAdd,
+    db: Session = Depends(get_db),
+    role: str = Depends(require_group_member)
+):
+    """
+    Add many users at once, by id or email. Users are resolved, with their
+    current membership, in one query and the new memberships inserted in one
+    statement.
+    """
+    user_ids = set(payload.user_ids)
+    emails = set(payload.emails)
+    users = db.query(
+        models.User.id,
+        models.User.email,
+        models.group_members.c.user_id.isnot(None)
+    ).outerjoin(
+        models.group_members,
+        and_(
+            models.group_members.c.user_id == models.User.id,
+            models.group_members.c.group_id == group_id
+        )
+    ).filter(
+        or_(models.User.id.in_(user_ids), models.User.email.in_(emails))
+    ).all()
+
+    found_ids = {user_id for user_id, _, _ in users}
+    found_emails = {email for _, email, _ in users}
+    already_members = sorted((user_id for user_id, _, is_member in users if is_member), key=str)
+    missing = sorted((user_id for user_id, _, is_member in users if not is_member), key=str)
+
+    added = add_group_members(db, group_id, missing)
+    if added:
+        bump_group_version(db, group_id)
+    db.commit()
+    invalidate_user_positions(added)
+    invalidate_memberships(group_id, added)
+
+    # Users added by a concurrent request in the meantime count as present
+    added_ids = set(added)
+    already_members += [user_id for user_id in missing if user_id not in added_ids]
+    return {
+        "added": added,
+        "already_members": already_members,
+        "not_found": sorted(str(user_id) for user_id in user_ids - found_ids) + sorted(emails - found_emails)
+    }
+
 @router.post("/{group_id}/members/{user_id}")
 def add_member(
     group_id: UUID,
     user_id: UUID,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    role: str = Depends(require_group_member)
 ):
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if user in group.members:
+    if member_role(db, group_id, user_id) is not None:
         raise HTTPException(status_code=400, detail="User is already a member")
     
-    group.members.append(user)
+    db.execute(insert(models.group_members).values(group_id=group_id, user_id=user_id))
+    bump_group_version(db, group_id)
     db.commit()
+    invalidate_user_positions([user_id])
+    invalidate_memberships(group_id, [user_id])
     return {"message": "Member added successfully"}
 
 @router.delete("/{group_id}")
 def delete_group(
     group_id: UUID,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    role: str = Depends(require_group_member)
 ):
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
-    
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
-    # Check if the current user is the creator (first member)
-    if group.members[0].id != current_user.id:
+    if role != models.GROUP_ROLE_ADMIN:
         raise HTTPException(
             status_code=403,
             detail="Only the group creator can delete the group"
         )
     
+    group = db.query(models.Group).filter(models.Group.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    
+    member_ids = group_member_ids(db, group_id)
     db.delete(group)
     db.commit()
+    invalidate_user_positions(member_ids)
+    invalidate_memberships(group_id, member_ids)
     return {"message": "Group deleted successfully"}
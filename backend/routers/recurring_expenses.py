@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from uuid import UUID
+
+import database
+import auth
+import schemas
+import models
+from utils.expenses import expense_shares, group_member_ids
+
+# Every route is scoped to a group the current user is a member of
+router = APIRouter(
+    prefix="/groups/{group_id}/recurring-expenses",
+    tags=["recurring-expenses"],
+    dependencies=[Depends(auth.require_group_member)]
+)
+
+@router.post("/", response_model=schemas.RecurringExpense)
+def create_recurring_expense(
+    group_id: UUID,
+    recurring_expense: schemas.RecurringExpenseCreate,
+    db: Session = Depends(database.get_db)
+):
+    # Validate the template against the current members; occurrences are
+    # expanded again against the members at the time they are materialized
+    member_ids = group_member_ids(db, group_id)
+    if recurring_expense.paid_by_id not in member_ids:
+        raise HTTPException(status_code=400, detail="The payer must be a member of the group")
+    try:
+        expense_shares(
+            schemas.ExpenseCreate(
+                amount=recurring_expense.amount,
+                description=recurring_expense.description,
+                category=recurring_expense.category,
+                group_id=group_id,
+                paid_by_id=recurring_expense.paid_by_id,
+                split=recurring_expense.split
+            ),
+            member_ids
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if recurring_expense.end_date and recurring_expense.end_date < recurring_expense.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    db_recurring_expense = models.RecurringExpense(
+        group_id=group_id,
+        paid_by_id=recurring_expense.paid_by_id,
+        description=recurring_expense.description,
+        category=recurring_expense.category,
+        amount_cents=recurring_expense.amount_cents,
+        split=recurring_expense.split.model_dump(mode="json"),
+        frequency=recurring_expense.frequency,
+        interval=recurring_expense.interval,
+        start_date=recurring_expense.start_date,
+        end_date=recurring_expense.end_date,
+        occurrences=0,
+        next_run=recurring_expense.start_date
+    )
+    db.add(db_recurring_expense)
+    db.commit()
+    db.refresh(db_recurring_expense)
+    return db_recurring_expense
+
+@router.get("/", response_model=List[schemas.RecurringExpense])
+def read_recurring_expenses(
+    group_id: UUID,
+    db: Session = Depends(database.get_db)
+):
+    return db.query(models.RecurringExpense).filter(
+        models.RecurringExpense.group_id == group_id
+    ).order_by(models.RecurringExpense.created_at).all()
+
+@router.delete("/{recurring_expense_id}")
+def delete_recurring_expense(
+    group_id: UUID,
+    recurring_expense_id: UUID,
+    db: Session = Depends(database.get_db)
+):
+    recurring_expense = db.query(models.RecurringExpense).filter(
+        models.RecurringExpense.id == recurring_expense_id,
+        models.RecurringExpense.group_id == group_id
+    ).first()
+    if not recurring_expense:
+        raise HTTPException(status_code=404, detail="Recurring expense not found")
+
+    # Expenses already materialized are kept
+    db.delete(recurring_expense)
+    db.commit()
+    return {"message": "Recurring expense deleted successfully"}
@@ -1,39 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Dict, Optional
 from uuid import UUID
+from datetime import datetime
 
 import database
 import auth
 import schemas
 import models
+from utils.balances import (
+    read_settlement_summary, apply_balance_deltas, settlement_deltas, invalidate_user_positions,
+    create_checkpoint_if_due, bump_group_version
+)
+from utils.expenses import group_member_ids
+from utils.fx import CurrencyConverter
+from utils.idempotency import (
+    IDEMPOTENCY_KEY_MAX_LENGTH, IdempotencyKeyInProgressError, IdempotencyKeyReusedError,
+    begin_idempotent_request, purge_expired_idempotency_keys, request_fingerprint, store_idempotent_response
+)
+from utils.membership import member_role
 
 router = APIRouter(prefix="/settlements", tags=["settlements"])
 
 @router.post("", response_model=schemas.SettlementResponse)
 def create_settlement(
     settlement: schemas.SettlementCreate,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    # Verify users are in the group
+    # A retry with the same Idempotency-Key gets the stored response back
+    # without validating or writing anything again
+    fingerprint = request_fingerprint("POST /settlements", settlement)
+    try:
+        claim, replay = begin_idempotent_request(db, current_user.id, idempotency_key, fingerprint)
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyKeyInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replay is not None:
+        return replay
+
+    # Verify the current user and both parties are in the group
+    if member_role(db, settlement.group_id, current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Group not found")
     group = db.query(models.Group).filter(models.Group.id == settlement.group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
     
-    member_ids = [member.id for member in group.members]
+    member_ids = group_member_ids(db, settlement.group_id)
     if settlement.paid_by_id not in member_ids or settlement.paid_to_id not in member_ids:
         raise HTTPException(status_code=400, detail="Both users must be members of the group")
     
+    # Balances move by the amount in the group's base currency, stored with
+    # the settlement
+    converter = CurrencyConverter(db, group.base_currency)
+    currency = settlement.currency or group.base_currency
+    now = datetime.utcnow()
+    try:
+        base_amount_cents = converter.amount(settlement.amount_cents, currency, now)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Create settlement record
     db_settlement = models.Settlement(
         paid_by_id=settlement.paid_by_id,
         paid_to_id=settlement.paid_to_id,
-        amount=settlement.amount,
-        group_id=settlement.group_id
+        amount_cents=settlement.amount_cents,
+        currency=currency,
+        base_amount_cents=base_amount_cents if currency != group.base_currency else None,
+        group_id=settlement.group_id,
+        created_at=now
     )
     db.add(db_settlement)
+
+    # Update member balances in the same transaction
+    apply_balance_deltas(
+        db,
+        settlement.group_id,
+        settlement_deltas(settlement.paid_by_id, settlement.paid_to_id, base_amount_cents)
+    )
+    bump_group_version(db, settlement.group_id)
+    if claim is not None:
+        # Stored in the same transaction as the settlement
+        db.flush()
+        store_idempotent_response(claim, schemas.SettlementResponse.model_validate(
+            {"settlement": db_settlement, "message": "Settlement recorded successfully"},
+            from_attributes=True
+        ))
+        background_tasks.add_task(purge_expired_idempotency_keys, db.get_bind())
     db.commit()
+    invalidate_user_positions(member_ids)
+    background_tasks.add_task(create_checkpoint_if_due, db.get_bind(), settlement.group_id)
     db.refresh(db_settlement)
     
     return {
@@ -44,81 +103,16 @@ def create_settlement(
 @router.get("/group/{group_id}/balances", response_model=schemas.GroupSettlementSummary)
 def get_group_balances(
     group_id: UUID,
+    mode: Optional[str] = None,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    role: str = Depends(auth.require_group_member)
 ):
-    # Get group and verify user is a member
-    group = db.query(models.Group).filter(
-        models.Group.id == group_id,
-        models.Group.members.any(id=current_user.id)
-    ).first()
+    group = db.query(models.Group).filter(models.Group.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    # Calculate balances for each member
-    balances = {}
-    for member in group.members:
-        balances[member.id] = {
-            "user_id": member.id,
-            "user_name": member.full_name,
-            "profile_picture_url": member.profile_picture_url,
-            "balance": 0.0
-        }
-
-    # Calculate expenses
-    expenses = db.query(models.Expense).filter(models.Expense.group_id == group_id).all()
-    for expense in expenses:
-        # Add amount paid by user
-        balances[expense.paid_by_id]["balance"] += expense.amount
-        
-        # Subtract splits from respective users
-        for split in expense.splits:
-            balances[split.user_id]["balance"] -= split.amount
-
-    # Calculate settlements
-    settlements = db.query(models.Settlement).filter(models.Settlement.group_id == group_id).all()
-    for settlement in settlements:
-        balances[settlement.paid_by_id]["balance"] += settlement.amount
-        balances[settlement.paid_to_id]["balance"] -= settlement.amount
-
-    # Convert balances dict to list
-    balance_list = list(balances.values())
-
-    # Calculate suggested settlements
-    suggested_settlements = []
-    debtors = [b for b in balance_list if b["balance"] < -0.01]  # Those who owe money
-    creditors = [b for b in balance_list if b["balance"] > 0.01]  # Those who are owed money
-
-    debtors.sort(key=lambda x: x["balance"])  # Sort by balance ascending (most negative first)
-    creditors.sort(key=lambda x: x["balance"], reverse=True)  # Sort by balance descending (most positive first)
-
-    for debtor in debtors:
-        while debtor["balance"] < -0.01 and creditors:  # While debtor still owes money
-            creditor = creditors[0]
-            if creditor["balance"] < 0.01:  # If creditor has been fully paid
-                creditors.pop(0)
-                continue
-
-            # Calculate settlement amount
-            amount = min(-debtor["balance"], creditor["balance"])
-            if amount > 0:
-                suggested_settlements.append({
-                    "from_user": {
-                        "id": debtor["user_id"],
-                        "name": debtor["user_name"]
-                    },
-                    "to_user": {
-                        "id": creditor["user_id"],
-                        "name": creditor["user_name"]
-                    },
-                    "amount": round(amount, 2)
-                })
-
-                # Update balances
-                debtor["balance"] += amount
-                creditor["balance"] -= amount
-
-    return {
-        "balances": balance_list,
-        "suggested_settlements": suggested_settlements
-    }
+    # Member balances and suggested settlements, cached per group version
+    try:
+        return read_settlement_summary(db, group, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -8,6 +8,7 @@ from auth import get_password_hash, get_current_active_user
 from sqlalchemy import or_
 from datetime import datetime
 from utils.s3 import upload_file_to_s3, delete_file_from_s3
+from utils.balances import read_user_position
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,6 +36,13 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 async def read_users_me(current_user: models.User = Depends(get_current_active_user)):
     return current_user
 
+@router.get("/me/balances", response_model=schemas.UserBalanceSummary)
+def read_my_balances(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    return read_user_position(db, current_user.id)
+
 @router.get("/", response_model=List[schemas.User])
 def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     users = db.query(models.User).offset(skip).limit(limit).all()
@@ -1,9 +1,28 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, BeforeValidator, model_validator
+from typing import List, Optional, Dict, Annotated, Literal
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 from uuid import UUID
 
+# Money is stored and computed as integer minor units (cents). The API keeps
+# exchanging decimal amounts, converted here at the schema boundary.
+def to_cents(amount: float) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+# Decimal amount read from an integer cents attribute/key
+CentsAmount = Annotated[float, BeforeValidator(from_cents)]
+
+# ISO 4217 currency code, accepted in any case
+CurrencyCode = Annotated[
+    str,
+    BeforeValidator(lambda value: value.upper() if isinstance(value, str) else value),
+    Field(pattern=r"^[A-Z]{3}$")
+]
+
 # User schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -26,6 +45,7 @@ class User(UserBase):
 class GroupBase(BaseModel):
     name: str
     description: Optional[str] = None
+    base_currency: CurrencyCode = "USD"
 
 class GroupCreate(GroupBase):
     pass
@@ -39,15 +59,39 @@ class Group(GroupBase):
     class Config:
         from_attributes = True
 
+class GroupMembersBulkAdd(BaseModel):
+    # Users to add, by id or by email; both may be mixed
+    user_ids: List[UUID] = Field(default_factory=list, max_length=1000)
+    emails: List[EmailStr] = Field(default_factory=list, max_length=1000)
+
+class GroupMembersBulkResult(BaseModel):
+    added: List[UUID]
+    already_members: List[UUID]
+    # Ids and emails matching no user
+    not_found: List[str]
+
+class GroupSummary(GroupBase):
+    id: UUID
+    member_count: int
+    # Latest expense, settlement or change to the group itself
+    last_activity: Optional[datetime] = None
+    # The current user's net balance in the group's base currency
+    balance: CentsAmount = Field(validation_alias="balance_cents")
+
 # Expense schemas
 class ExpenseSplitBase(BaseModel):
     user_id: UUID
     amount: float
 
 class ExpenseSplitCreate(ExpenseSplitBase):
-    pass
+    amount: float = Field(ge=0)
+
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
 
 class ExpenseSplit(ExpenseSplitBase):
+    amount: CentsAmount = Field(validation_alias="amount_cents")
     id: UUID
     expense_id: UUID
     is_settled: bool
@@ -59,18 +103,119 @@ class ExpenseBase(BaseModel):
     amount: float
     description: str
     group_id: UUID
+    category: str = Field("uncategorized", min_length=1, max_length=50)
+    # Defaults to the group's base currency
+    currency: Optional[CurrencyCode] = None
+
+class SplitSpec(BaseModel):
+    """Compact split expanded server-side into one split per participant."""
+    mode: Literal["equal", "shares", "percentage", "exact"]
+    # equal: participants, every group member by default
+    include: Optional[List[UUID]] = None
+    # Members left out of the split, whatever the mode
+    exclude: List[UUID] = []
+    # shares: relative weight per member; percentage: percentages adding up to 100
+    weights: Optional[Dict[UUID, float]] = None
+    # exact: amount per member
+    amounts: Optional[Dict[UUID, Annotated[float, Field(ge=0)]]] = None
 
 class ExpenseCreate(ExpenseBase):
+    # Expenses are positive and shared in non-negative parts, so an amount
+    # converted to the base currency is always allocated over its shares
+    amount: float = Field(gt=0)
+    paid_by_id: UUID
+    # Either explicit splits or a compact split spec
+    splits: Optional[List[ExpenseSplitCreate]] = None
+    split: Optional[SplitSpec] = None
+    # Defaults to the time of creation
+    date: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_split(self):
+        if (self.splits is None) == (self.split is None):
+            raise ValueError("Provide either splits or split")
+        return self
+
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
+
+class ExpenseUpdate(BaseModel):
+    # Omitted fields are left unchanged; splits or split replace the splits
+    amount: Optional[float] = Field(None, gt=0)
+    description: Optional[str] = None
+    category: Optional[str] = Field(None, min_length=1, max_length=50)
+    currency: Optional[CurrencyCode] = None
+    paid_by_id: Optional[UUID] = None
+    date: Optional[datetime] = None
+    splits: Optional[List[ExpenseSplitCreate]] = None
+    split: Optional[SplitSpec] = None
+    # updated_at of the expense as last read; the update is rejected if it
+    # has changed since
+    expected_updated_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_split(self):
+        if self.splits is not None and self.split is not None:
+            raise ValueError("Provide either splits or split")
+        return self
+
+class RecurringExpenseBase(BaseModel):
+    amount: float
+    description: str
+    category: str = Field("uncategorized", min_length=1, max_length=50)
     paid_by_id: UUID
-    splits: List[ExpenseSplitCreate]
+    split: SplitSpec
+    frequency: Literal["daily", "weekly", "monthly", "yearly"]
+    interval: int = Field(1, ge=1)
+    # First occurrence; a past date is caught up by the recurring worker
+    start_date: datetime
+    end_date: Optional[datetime] = None
+
+class RecurringExpenseCreate(RecurringExpenseBase):
+    amount: float = Field(gt=0)
+
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
+
+class RecurringExpense(RecurringExpenseBase):
+    amount: CentsAmount = Field(validation_alias="amount_cents")
+    id: UUID
+    group_id: UUID
+    occurrences: int
+    next_run: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ExpenseBulkCreate(BaseModel):
+    expenses: List[ExpenseCreate]
+    # atomic: create nothing if any expense is invalid
+    # best_effort: create the valid expenses and report the others
+    mode: Literal["atomic", "best_effort"] = "atomic"
+
+class ExpenseBulkItemResult(BaseModel):
+    index: int
+    status: Literal["created", "rejected", "skipped"]
+    expense_id: Optional[UUID] = None
+    error: Optional[str] = None
+
+class ExpenseBulkResult(BaseModel):
+    created: int
+    rejected: int
+    results: List[ExpenseBulkItemResult]
 
 class Expense(ExpenseBase):
+    amount: CentsAmount = Field(validation_alias="amount_cents")
     id: UUID
     date: datetime
     paid_by_id: UUID
     group_id: UUID
     receipt_url: Optional[str] = None
     splits: List[ExpenseSplit]
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -81,12 +226,19 @@ class SettlementCreate(BaseModel):
     paid_to_id: UUID
     amount: float
     group_id: UUID
+    # Defaults to the group's base currency
+    currency: Optional[CurrencyCode] = None
+
+    @property
+    def amount_cents(self) -> int:
+        return to_cents(self.amount)
 
 class Settlement(BaseModel):
     id: UUID
     paid_by_id: UUID
     paid_to_id: UUID
-    amount: float
+    amount: CentsAmount = Field(validation_alias="amount_cents")
+    currency: str
     group_id: UUID
     created_at: datetime
     updated_at: datetime
@@ -103,18 +255,84 @@ class GroupBalances(BaseModel):
     user_id: UUID
     user_name: str
     profile_picture_url: Optional[str] = None
-    balance: float
+    balance: CentsAmount = Field(validation_alias="balance_cents")
 
     class Config:
         from_attributes = True
 
+class SuggestedSettlement(BaseModel):
+    paid_by_id: UUID
+    paid_by_name: str
+    paid_to_id: UUID
+    paid_to_name: str
+    amount: CentsAmount = Field(validation_alias="amount_cents")
+
 class GroupSettlementSummary(BaseModel):
     balances: List[GroupBalances]
-    suggested_settlements: List[Dict[str, Any]]
+    suggested_settlements: List[SuggestedSettlement]
+    # Exact mode was asked for, but the group has too many members with a
+    # non-zero balance: the suggestions are the greedy plan
+    exact_capped: bool = False
+
+    class Config:
+        from_attributes = True
+
+class UserGroupBalance(BaseModel):
+    group_id: UUID
+    group_name: str
+    # The group's base currency
+    currency: str
+    balance: CentsAmount = Field(validation_alias="balance_cents")
+
+class CounterpartyBalance(BaseModel):
+    user_id: UUID
+    user_name: str
+    currency: str
+    # Positive: the counterparty owes the current user
+    balance: CentsAmount = Field(validation_alias="balance_cents")
+
+class CurrencyBalance(BaseModel):
+    currency: str
+    balance: CentsAmount = Field(validation_alias="balance_cents")
+
+class UserBalanceSummary(BaseModel):
+    # None when the user's groups are kept in different currencies
+    total: Optional[CentsAmount] = Field(validation_alias="total_cents")
+    totals: List[CurrencyBalance]
+    groups: List[UserGroupBalance]
+    counterparties: List[CounterpartyBalance]
+
+# Analytics schemas
+class SpendingRollup(BaseModel):
+    month: date
+    category: str
+    paid_by_id: UUID
+    total: CentsAmount = Field(validation_alias="total_cents")
+    expense_count: int
 
     class Config:
         from_attributes = True
 
+class SpendingTotal(BaseModel):
+    total: CentsAmount = Field(validation_alias="total_cents")
+    expense_count: int
+
+class MonthlySpending(SpendingTotal):
+    month: date
+
+class CategorySpending(SpendingTotal):
+    category: str
+
+class PayerSpending(SpendingTotal):
+    paid_by_id: UUID
+
+class GroupAnalytics(BaseModel):
+    group_id: UUID
+    rollups: List[SpendingRollup]
+    by_month: List[MonthlySpending]
+    by_category: List[CategorySpending]
+    by_payer: List[PayerSpending]
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,56 @@
+import sys
+import os
+import argparse
+import uuid
+
+# Add parent directory to path to import from parent
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+import models
+from utils.balances import find_balance_mismatches, rebuild_group_balances
+
+def check_balances(group_id=None, fix=False, use_checkpoints=True):
+    db = SessionLocal()
+    try:
+        query = db.query(models.Group.id)
+        if group_id:
+            query = query.filter(models.Group.id == group_id)
+        group_ids = [gid for (gid,) in query.all()]
+
+        inconsistent = 0
+        for gid in group_ids:
+            mismatches = find_balance_mismatches(db, gid, use_checkpoints)
+            if not mismatches:
+                continue
+
+            inconsistent += 1
+            print(f"Group {gid}: {len(mismatches)} member balance(s) out of sync")
+            for user_id, (stored, expected) in mismatches.items():
+                print(f"  user {user_id}: stored={stored / 100:.2f} expected={expected / 100:.2f}")
+
+            if fix:
+                rebuild_group_balances(db, gid, use_checkpoints)
+                db.commit()
+                print(f"  rebuilt balances for group {gid}")
+
+        print(f"Checked {len(group_ids)} group(s), {inconsistent} inconsistent")
+        return inconsistent
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare materialized group balances with a full recompute"
+    )
+    parser.add_argument("--group", type=uuid.UUID, help="Only check this group id")
+    parser.add_argument("--fix", action="store_true", help="Rebuild groups that are out of sync")
+    parser.add_argument(
+        "--no-checkpoints",
+        action="store_true",
+        help="Replay the whole history instead of starting from balance checkpoints"
+    )
+    args = parser.parse_args()
+
+    inconsistent = check_balances(args.group, args.fix, not args.no_checkpoints)
+    sys.exit(1 if inconsistent and not args.fix else 0)
@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import from parent
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from utils.fx import FX_REFERENCE_CURRENCY, import_fx_rates
+
+def import_rates(path):
+    db = SessionLocal()
+    try:
+        with open(path, "rb") as fileobj:
+            imported = import_fx_rates(db, fileobj)
+        db.commit()
+        print(f"Imported {imported} rate(s) against {FX_REFERENCE_CURRENCY} from {path}")
+        return imported
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load daily exchange rates from a CSV file with date, currency and rate columns"
+    )
+    parser.add_argument("path", help="CSV file; rates are units of currency per unit of the reference currency")
+    args = parser.parse_args()
+
+    try:
+        import_rates(args.path)
+    except ValueError as e:
+        print(f"Import failed: {str(e)}")
+        sys.exit(1)
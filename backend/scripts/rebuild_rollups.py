@@ -0,0 +1,39 @@
+import sys
+import os
+import argparse
+import uuid
+
+# Add parent directory to path to import from parent
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+import models
+from utils.analytics import rebuild_group_rollups
+
+def rebuild_rollups(group_id=None):
+    db = SessionLocal()
+    try:
+        query = db.query(models.Group.id)
+        if group_id:
+            query = query.filter(models.Group.id == group_id)
+        group_ids = [gid for (gid,) in query.all()]
+
+        # One transaction per group, so a large backfill holds no long locks
+        for gid in group_ids:
+            rebuild_group_rollups(db, gid)
+            db.commit()
+            print(f"Rebuilt spending rollup for group {gid}")
+
+        print(f"Rebuilt {len(group_ids)} group(s)")
+        return len(group_ids)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute the spending analytics rollup from the expenses"
+    )
+    parser.add_argument("--group", type=uuid.UUID, help="Only rebuild this group id")
+    args = parser.parse_args()
+
+    rebuild_rollups(args.group)
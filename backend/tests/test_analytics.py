@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import models
+from tests.test_balances import seed_group
+from tests.test_expenses import expense_payload
+from utils.analytics import rebuild_group_rollups
+
+def rollup_rows(db, group_id):
+    db.expire_all()
+    return {
+        (row.month.isoformat(), row.category, row.paid_by_id): (row.total_cents, row.expense_count)
+        for row in db.query(models.ExpenseRollup).filter(models.ExpenseRollup.group_id == group_id)
+    }
+
+def rebuilt_rows(db, group_id):
+    rebuild_group_rollups(db, group_id)
+    db.flush()
+    rows = rollup_rows(db, group_id)
+    db.rollback()
+    return rows
+
+def test_rollup_follows_every_expense_write(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    alice, bob = users[0].id, users[1].id
+    client = make_client(alice)
+
+    def create(payer, amount, category, date):
+        payload = expense_payload(group, payer, users, amount=amount)
+        payload.update(category=category, date=date.isoformat())
+        response = client.post(f"/groups/{group_id}/expenses/", json=payload)
+        assert response.status_code == 200
+        return response.json()
+
+    dinner = create(users[0], 30.0, "food", datetime(2026, 1, 5))
+    create(users[0], 10.0, "food", datetime(2026, 1, 20))
+    taxi = create(users[1], 20.0, "transport", datetime(2026, 2, 1))
+    response = client.post(f"/groups/{group_id}/expenses/bulk", json={"expenses": [
+        dict(expense_payload(group, users[1], users, amount=8.0), category="food", date=datetime(2026, 2, 3).isoformat())
+    ]})
+    assert response.status_code == 200
+
+    assert rollup_rows(db_session, group_id) == {
+        ("2026-01-01", "food", alice): (4000, 2),
+        ("2026-02-01", "transport", bob): (2000, 1),
+        ("2026-02-01", "food", bob): (800, 1)
+    }
+
+    # Moving an expense to another month and category moves its spend
+    response = client.patch(f"/groups/{group_id}/expenses/{dinner['id']}", json={
+        "category": "drinks", "date": datetime(2026, 2, 10).isoformat()
+    })
+    assert response.status_code == 200
+    response = client.delete(f"/groups/{group_id}/expenses/{taxi['id']}")
+    assert response.status_code == 200
+
+    expected = {
+        ("2026-01-01", "food", alice): (1000, 1),
+        ("2026-02-01", "drinks", alice): (3000, 1),
+        ("2026-02-01", "food", bob): (800, 1)
+    }
+    assert rollup_rows(db_session, group_id) == expected
+    assert rebuilt_rows(db_session, group_id) == expected
+
+def test_analytics_endpoint_reads_rollup(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    alice, bob = users[0].id, users[1].id
+    db_session.add_all([
+        models.ExpenseRollup(group_id=group_id, month=datetime(2026, 1, 1).date(), category="food",
+                             paid_by_id=alice, total_cents=4000, expense_count=2),
+        models.ExpenseRollup(group_id=group_id, month=datetime(2026, 2, 1).date(), category="food",
+                             paid_by_id=bob, total_cents=800, expense_count=1),
+        models.ExpenseRollup(group_id=group_id, month=datetime(2026, 2, 1).date(), category="rent",
+                             paid_by_id=alice, total_cents=50000, expense_count=1)
+    ])
+    db_session.commit()
+    client = make_client(alice)
+
+    query_counter.count = 0
+    response = client.get(f"/groups/{group_id}/analytics")
+    assert response.status_code == 200
+    assert query_counter.count == 3  # current user, membership, rollup
+
+    body = response.json()
+    assert len(body["rollups"]) == 3
+    assert body["by_month"] == [
+        {"month": "2026-01-01", "total": 40.0, "expense_count": 2},
+        {"month": "2026-02-01", "total": 508.0, "expense_count": 2}
+    ]
+    assert {row["category"]: row["total"] for row in body["by_category"]} == {"food": 48.0, "rent": 500.0}
+    assert {row["paid_by_id"]: row["total"] for row in body["by_payer"]} == {str(alice): 540.0, str(bob): 8.0}
+
+    response = client.get(f"/groups/{group_id}/analytics", params={"start_month": "2026-02-15"})
+    assert [row["month"] for row in response.json()["by_month"]] == ["2026-02-01"]
@@ -0,0 +1,199 @@
+from datetime import timedelta
+
+import pytest
+
+import models
+import utils.balances
+from schemas import to_cents
+from utils.balances import (
+    compute_member_balances, create_checkpoint_if_due, find_balance_mismatches,
+    invalidate_checkpoints, latest_checkpoint, rebuild_group_balances
+)
+
+def seed_group(db, member_count, expense_count, settlement_count=0):
+    users = [
+        models.User(email=f"user{i}@example.com", full_name=f"User {i}", hashed_password="x")
+        for i in range(member_count)
+    ]
+    group = models.Group(name="Trip", members=users)
+    db.add(group)
+    db.flush()
+    # The first user created the group
+    db.execute(models.group_members.update().where(
+        models.group_members.c.group_id == group.id,
+        models.group_members.c.user_id == users[0].id
+    ).values(role=models.GROUP_ROLE_ADMIN))
+
+    for i in range(expense_count):
+        payer = users[i % member_count]
+        expense = models.Expense(
+            amount_cents=1000 * member_count,
+            description=f"Expense {i}",
+            paid_by_id=payer.id,
+            group_id=group.id
+        )
+        expense.splits = [models.ExpenseSplit(user_id=user.id, amount_cents=1000) for user in users]
+        db.add(expense)
+
+    for i in range(settlement_count):
+        db.add(models.Settlement(
+            paid_by_id=users[(i + 1) % member_count].id,
+            paid_to_id=users[i % member_count].id,
+            amount_cents=500,
+            group_id=group.id
+        ))
+
+    db.flush()
+    rebuild_group_balances(db, group.id)
+    db.commit()
+    return group, users
+
+def test_compute_member_balances(db_session):
+    group, users = seed_group(db_session, member_count=3, expense_count=2, settlement_count=1)
+
+    balances = compute_member_balances(db_session, group.id)
+
+    # users[0] and users[1] each paid 30 and owe 20; users[1] paid users[0] 5
+    assert balances[users[0].id] == 500
+    assert balances[users[1].id] == 1500
+    assert balances[users[2].id] == -2000
+    assert sum(balances.values()) == 0
+
+@pytest.mark.parametrize("expense_count", [5, 50])
+def test_compute_member_balances_query_count_is_constant(db_session, query_counter, expense_count):
+    group, _ = seed_group(db_session, member_count=4, expense_count=expense_count, settlement_count=3)
+    group_id = group.id
+
+    query_counter.count = 0
+    compute_member_balances(db_session, group_id)
+
+    # One checkpoint lookup plus the four aggregates
+    assert query_counter.count == 5
+
+def test_balance_endpoints_query_count_is_constant(db_session, query_counter, make_client):
+    group, users = seed_group(db_session, member_count=4, expense_count=0)
+    client = make_client(users[0].id)
+
+    counts = []
+    for _ in range(2):
+        for user in users:
+            response = client.post(f"/groups/{group.id}/expenses/", json={
+                "amount": 40.0,
+                "description": "Dinner",
+                "group_id": str(group.id),
+                "paid_by_id": str(user.id),
+                "splits": [{"user_id": str(u.id), "amount": 10.0} for u in users]
+            })
+            assert response.status_code == 200
+
+        for url in (f"/groups/{group.id}/expenses/balances", f"/settlements/group/{group.id}/balances"):
+            query_counter.count = 0
+            response = client.get(url)
+            assert response.status_code == 200
+            counts.append(query_counter.count)
+
+    assert counts[:2] == counts[2:]
+    assert not find_balance_mismatches(db_session, group.id)
+
+def test_amounts_are_converted_to_exact_cents():
+    assert to_cents(19.99) == 1999
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents(33.335) == 3334
+
+def test_split_validation_is_exact(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    client = make_client(users[0].id)
+
+    payload = {
+        "amount": 100.0,
+        "description": "Hotel",
+        "group_id": str(group.id),
+        "paid_by_id": str(users[0].id),
+        "splits": [{"user_id": str(u.id), "amount": 33.33} for u in users]
+    }
+    assert client.post(f"/groups/{group.id}/expenses/", json=payload).status_code == 400
+
+    payload["splits"][0]["amount"] = 33.34
+    response = client.post(f"/groups/{group.id}/expenses/", json=payload)
+    assert response.status_code == 200
+    assert response.json()["amount"] == 100.0
+    assert [split["amount"] for split in response.json()["splits"]] == [33.34, 33.33, 33.33]
+
+def test_my_balances_across_groups(db_session, make_client):
+    trip, users = seed_group(db_session, member_count=3, expense_count=0)
+    alice, bob, carol = users
+    flat = models.Group(name="Flat", members=[alice, bob])
+    db_session.add(flat)
+    db_session.commit()
+
+    client = make_client(alice.id)
+    assert client.get("/users/me/balances").json()["total"] == 0
+
+    # Alice pays 30 in the trip, Bob pays 20 in the flat
+    for group, payer, amount, members in ((trip, alice, 30.0, users), (flat, bob, 20.0, [alice, bob])):
+        response = client.post(f"/groups/{group.id}/expenses/", json={
+            "amount": amount,
+            "description": "Shared",
+            "group_id": str(group.id),
+            "paid_by_id": str(payer.id),
+            "splits": [{"user_id": str(u.id), "amount": amount / len(members)} for u in members]
+        })
+        assert response.status_code == 200
+
+    # The cached position was invalidated by the writes
+    summary = client.get("/users/me/balances").json()
+    assert summary["total"] == 10.0
+    assert summary["totals"] == [{"currency": "USD", "balance": 10.0}]
+    assert {g["group_name"]: g["balance"] for g in summary["groups"]} == {"Trip": 20.0, "Flat": -10.0}
+    # Bob's 10 from the trip and Alice's 10 from the flat cancel out
+    assert {c["user_name"]: c["balance"] for c in summary["counterparties"]} == {"User 2": 10.0}
+
+def test_checkpoint_replays_only_newer_records(db_session, db_engine, monkeypatch):
+    group, users = seed_group(db_session, member_count=3, expense_count=6, settlement_count=2)
+    group_id = group.id
+    expected = compute_member_balances(db_session, group_id, use_checkpoint=False)
+
+    monkeypatch.setattr(utils.balances, "CHECKPOINT_INTERVAL", 5)
+    monkeypatch.setattr(utils.balances, "CHECKPOINT_SAFETY_LAG", timedelta(0))
+    create_checkpoint_if_due(db_engine, group_id)
+
+    checkpoint = latest_checkpoint(db_session, group_id)
+    assert checkpoint is not None
+    assert compute_member_balances(db_session, group_id) == expected
+
+    # Records after the checkpoint are replayed on top of it
+    db_session.add(models.Settlement(
+        paid_by_id=users[2].id, paid_to_id=users[0].id, amount_cents=700, group_id=group_id
+    ))
+    db_session.commit()
+    expected = compute_member_balances(db_session, group_id, use_checkpoint=False)
+    assert compute_member_balances(db_session, group_id) == expected
+
+    # Deleting a record the checkpoint covers drops the checkpoint
+    expense = db_session.query(models.Expense).filter(models.Expense.group_id == group_id).first()
+    invalidate_checkpoints(db_session, group_id, expense.created_at)
+    db_session.delete(expense)
+    db_session.commit()
+    assert latest_checkpoint(db_session, group_id) is None
+
+def test_settlement_summary_is_cached_per_group_version(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=1)
+    client = make_client(users[0].id)
+    cache = utils.balances.settlement_summary_cache
+    url = f"/groups/{group.id}/expenses/balances"
+
+    first = client.get(url).json()
+    hits = cache.hits
+    assert client.get(url).json() == first
+    assert cache.hits == hits + 1
+
+    # A settlement bumps the group version, so the next read recomputes
+    response = client.post("/settlements", json={
+        "paid_by_id": str(users[1].id),
+        "paid_to_id": str(users[0].id),
+        "amount": 10.0,
+        "group_id": str(group.id)
+    })
+    assert response.status_code == 200
+    assert client.get(url).json()["suggested_settlements"] == []
+    assert cache.hits == hits + 1
@@ -0,0 +1,36 @@
+from utils.cache import LRUCacheBackend, TTLCache, VersionedCache
+
+def test_lru_backend_evicts_least_recently_used():
+    backend = LRUCacheBackend(max_entries=2)
+    backend.set(("a",), 1)
+    backend.set(("b",), 2)
+    backend.get(("a",))
+    backend.set(("c",), 3)
+
+    assert backend.get(("a",)) == 1
+    assert backend.get(("b",)) is None
+    assert backend.get(("c",)) == 3
+    assert backend.size() == 2
+
+def test_versioned_cache_counts_hits_and_misses():
+    cache = VersionedCache(LRUCacheBackend(max_entries=10))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.get_or_compute(("group", 1), compute) == {"value": 1}
+    assert cache.get_or_compute(("group", 1), compute) == {"value": 1}
+    # A new version is a new key
+    assert cache.get_or_compute(("group", 2), compute) == {"value": 2}
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 2}
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(ttl_seconds=60)
+    cache.set("user", {"total_cents": 0})
+    assert cache.get("user") == {"total_cents": 0}
+
+    cache.invalidate(["user"])
+    assert cache.get("user") is None
+    assert cache.stats()["hits"] == 1
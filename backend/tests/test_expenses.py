@@ -0,0 +1,368 @@
+from datetime import datetime
+from uuid import UUID, uuid4
+import json
+
+import pytest
+
+import models
+from tests.test_balances import seed_group
+from utils.balances import find_balance_mismatches
+
+def expense_payload(group, payer, users, amount=30.0, description="Dinner"):
+    share = round(amount / len(users), 2)
+    splits = [{"user_id": str(u.id), "amount": share} for u in users]
+    splits[0]["amount"] = round(amount - share * (len(users) - 1), 2)
+    return {
+        "amount": amount,
+        "description": description,
+        "group_id": str(group.id),
+        "paid_by_id": str(payer.id),
+        "splits": splits
+    }
+
+def test_bulk_create_atomic_rejects_everything_on_one_error(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    client = make_client(users[0].id)
+
+    invalid = expense_payload(group, users[1], users)
+    invalid["splits"][0]["user_id"] = str(uuid4())
+    response = client.post(f"/groups/{group.id}/expenses/bulk", json={
+        "expenses": [expense_payload(group, users[0], users), invalid]
+    })
+
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["created"] == 0 and detail["rejected"] == 1
+    assert [r["status"] for r in detail["results"]] == ["skipped", "rejected"]
+    assert db_session.query(models.Expense).count() == 0
+
+def test_bulk_create_best_effort_keeps_valid_expenses(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    group_id = group.id
+    client = make_client(users[0].id)
+
+    unbalanced = expense_payload(group, users[1], users)
+    unbalanced["amount"] = 31.0
+    response = client.post(f"/groups/{group.id}/expenses/bulk", json={
+        "mode": "best_effort",
+        "expenses": [
+            expense_payload(group, users[0], users),
+            unbalanced,
+            expense_payload(group, users[2], users, amount=10.0)
+        ]
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2 and body["rejected"] == 1
+    assert [r["status"] for r in body["results"]] == ["created", "rejected", "created"]
+    assert body["results"][1]["error"] == "Split amounts must equal the total expense amount"
+
+    db_session.expire_all()
+    assert db_session.query(models.Expense).count() == 2
+    assert db_session.query(models.ExpenseSplit).count() == 6
+    assert find_balance_mismatches(db_session, group_id) == {}
+    assert db_session.get(models.Group, group_id).version == 1
+
+def test_non_positive_amounts_are_rejected(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    client = make_client(users[0].id)
+
+    negative = expense_payload(group, users[0], users, amount=-10.0)
+    negative_share = expense_payload(group, users[0], users, amount=10.0)
+    negative_share["splits"] = [
+        {"user_id": str(users[0].id), "amount": 15.0},
+        {"user_id": str(users[1].id), "amount": -5.0}
+    ]
+    for payload in (negative, negative_share):
+        assert client.post(f"/groups/{group.id}/expenses/", json=payload).status_code == 422
+    assert db_session.query(models.Expense).count() == 0
+
+def read_events(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_import_csv_statement_in_batches(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    group_id = group.id
+    client = make_client(users[0].id)
+
+    statement = "\n".join([
+        "Date,Description,Amount",
+        "2026-03-01,Uber,-12.50",
+        "2026-03-02,Groceries,\"-1,000.00\"",
+        "not a date,Broken,-5.00",
+        "03/04/2026,Cinema,-30.00",
+        "2026-03-05,Zero,0.00"
+    ])
+    response = client.post(
+        f"/groups/{group.id}/expenses/import?batch_size=2",
+        files={"file": ("statement.csv", statement.encode(), "text/csv")}
+    )
+
+    assert response.status_code == 200
+    events = read_events(response)
+    assert [e["event"] for e in events] == ["progress", "progress", "progress", "done"]
+    assert [r["row"] for r in events[1]["rejected_rows"]] == [4]
+    assert [r["row"] for r in events[2]["rejected_rows"]] == [6]
+    assert events[-1] == {"event": "done", "rows": 5, "created": 3, "rejected": 2}
+
+    db_session.expire_all()
+    expenses = db_session.query(models.Expense).order_by(models.Expense.date).all()
+    assert [e.amount_cents for e in expenses] == [1250, 100000, 3000]
+    assert expenses[0].date == datetime(2026, 3, 1)
+    # 12.50 split three ways: the remainder cent goes to one member
+    assert sorted(s.amount_cents for s in expenses[0].splits) == [416, 417, 417]
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+def test_import_ofx_statement(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    client = make_client(users[0].id)
+
+    statement = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260310120000[-5:EST]<TRNAMT>-42.00<NAME>Hotel</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20260311<TRNAMT>abc<NAME>Broken</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+    response = client.post(
+        f"/groups/{group.id}/expenses/import",
+        params={"paid_by_id": str(users[1].id)},
+        files={"file": ("statement.ofx", statement.encode(), "application/x-ofx")}
+    )
+
+    events = read_events(response)
+    assert events[0]["rejected_rows"] == [{"row": 2, "error": "Unrecognized amount: 'abc'"}]
+    assert events[-1] == {"event": "done", "rows": 2, "created": 1, "rejected": 1}
+    expense = db_session.query(models.Expense).one()
+    assert (expense.description, expense.amount_cents, expense.paid_by_id) == ("Hotel", 4200, users[1].id)
+
+def test_import_rejects_credits(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    client = make_client(users[0].id)
+
+    def import_csv(lines, **params):
+        response = client.post(
+            f"/groups/{group.id}/expenses/import",
+            params=params,
+            files={"file": ("statement.csv", "\n".join(lines).encode(), "text/csv")}
+        )
+        assert response.status_code == 200
+        return read_events(response)
+
+    # Charges negative (the default), parentheses meaning negative: the
+    # refund is a credit
+    events = import_csv([
+        "Date,Description,Amount",
+        "2026-03-01,Taxi,-20.00",
+        "2026-03-02,Refund,15.00",
+        "2026-03-03,Fee,(0.50)"
+    ])
+    assert events[-1] == {"event": "done", "rows": 3, "created": 2, "rejected": 1}
+    assert events[0]["rejected_rows"] == [{"row": 3, "error": "Credit (payment or refund), not imported"}]
+
+    # Charges positive, as some card statements sign them
+    events = import_csv(["Date,Description,Amount", "2026-03-04,Hotel,80.00", "2026-03-05,Refund,-80.00"],
+                        charge_sign="positive")
+    assert events[-1] == {"event": "done", "rows": 2, "created": 1, "rejected": 1}
+
+    # Separate debit and credit columns
+    events = import_csv([
+        "Date,Description,Debit,Credit",
+        "2026-03-06,Museum,12.00,",
+        "2026-03-07,Salary,,1000.00"
+    ])
+    assert events[-1] == {"event": "done", "rows": 2, "created": 1, "rejected": 1}
+
+    db_session.expire_all()
+    expenses = db_session.query(models.Expense).order_by(models.Expense.date).all()
+    assert [(e.description, e.amount_cents) for e in expenses] == [
+        ("Taxi", 2000), ("Fee", 50), ("Hotel", 8000), ("Museum", 1200)
+    ]
+    assert client.post(
+        f"/groups/{group.id}/expenses/import",
+        params={"charge_sign": "up"},
+        files={"file": ("statement.csv", b"Date,Amount\n", "text/csv")}
+    ).status_code == 400
+
+def test_export_streams_csv_and_ndjson(db_session, query_counter, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=2)
+    group_id = group.id
+    client = make_client(users[0].id)
+
+    query_counter.count = 0
+    response = client.get(f"/groups/{group_id}/expenses/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("expense_id,date,description,amount")
+    assert len(lines) == 1 + 2 * 3
+    # Current user, membership check and the single export join
+    assert query_counter.count == 3
+
+    response = client.get(f"/groups/{group_id}/expenses/export?format=ndjson")
+    expenses = read_events(response)
+    assert [e["amount"] for e in expenses] == [30.0, 30.0]
+    assert all(len(e["splits"]) == 3 for e in expenses)
+    assert {s["amount"] for e in expenses for s in e["splits"]} == {10.0}
+
+    assert client.get(f"/groups/{group_id}/expenses/export?format=xml").status_code == 400
+
+def test_read_expenses_keyset_pagination(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=5)
+    group_id = group.id
+    # Two expenses share a date so the id breaks the tie
+    expenses = db_session.query(models.Expense).all()
+    for day, expense in zip([1, 2, 2, 3, 4], expenses):
+        expense.date = datetime(2026, 3, day)
+    db_session.commit()
+    expected = [e.id for e in sorted(expenses, key=lambda e: (e.date, str(e.id)), reverse=True)]
+    client = make_client(users[0].id)
+
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/groups/{group_id}/expenses/", params=params)
+        assert response.status_code == 200
+        pages.append([e["id"] for e in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [UUID(i) for page in pages for i in page] == expected
+
+    response = client.get(f"/groups/{group_id}/expenses/", params={
+        "paid_by_id": str(users[1].id),
+        "start_date": "2026-03-02T00:00:00",
+        "end_date": "2026-03-04T00:00:00"
+    })
+    assert sorted(e["id"] for e in response.json()) == sorted(
+        str(e.id) for e in expenses
+        if e.paid_by_id == users[1].id and datetime(2026, 3, 2) <= e.date < datetime(2026, 3, 4)
+    )
+
+    assert client.get(f"/groups/{group_id}/expenses/?cursor=bogus").status_code == 400
+
+@pytest.mark.parametrize("expense_count", [5, 50])
+def test_expense_endpoints_query_count_is_constant(db_session, query_counter, make_client, expense_count):
+    group, users = seed_group(db_session, member_count=4, expense_count=expense_count)
+    group_id = group.id
+    expense_id = db_session.query(models.Expense.id).first()[0]
+    client = make_client(users[0].id)
+
+    query_counter.count = 0
+    response = client.get(f"/groups/{group_id}/expenses/")
+    assert len(response.json()) == expense_count
+    # Current user, membership check, expenses and their splits
+    assert query_counter.count == 4
+
+    query_counter.count = 0
+    response = client.get(f"/groups/{group_id}/expenses/{expense_id}")
+    assert len(response.json()["splits"]) == 4
+    # Current user, expense and its splits; membership is cached by now
+    assert query_counter.count == 3
+
+def test_create_expense_with_compact_split(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    group_id = group.id
+    client = make_client(users[0].id)
+
+    response = client.post(f"/groups/{group_id}/expenses/", json={
+        "amount": 100.0,
+        "description": "Rent",
+        "group_id": str(group_id),
+        "paid_by_id": str(users[0].id),
+        "split": {"mode": "equal"}
+    })
+
+    assert response.status_code == 200
+    assert sorted(s["amount"] for s in response.json()["splits"]) == [33.33, 33.33, 33.34]
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+    response = client.post(f"/groups/{group_id}/expenses/", json={
+        "amount": 100.0,
+        "description": "Rent",
+        "group_id": str(group_id),
+        "paid_by_id": str(users[0].id),
+        "split": {"mode": "percentage", "weights": {str(users[0].id): 60, str(users[1].id): 30}}
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Split percentages must add up to 100"
+
+def test_search_expenses_ranks_and_paginates(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=6)
+    group_id = group.id
+    descriptions = ["Uber to airport", "Uber", "Dinner at Uberto", "Groceries", "uber eats", "Taxi"]
+    for expense, description in zip(db_session.query(models.Expense).all(), descriptions):
+        expense.description = description
+    db_session.commit()
+    client = make_client(users[0].id)
+
+    response = client.get(f"/groups/{group_id}/expenses/search", params={"q": "uber"})
+    found = [e["description"] for e in response.json()]
+    # Prefix matching also finds "Uberto"; the shortest match ranks first
+    assert sorted(found) == ["Dinner at Uberto", "Uber", "Uber to airport", "uber eats"]
+    assert found[0] == "Uber"
+
+    pages = []
+    cursor = None
+    while True:
+        params = {"q": "uber", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/groups/{group_id}/expenses/search", params=params)
+        pages.append([e["description"] for e in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [description for page in pages for description in page] == found
+    assert [len(page) for page in pages] == [3, 1]
+
+    # Every term must match
+    response = client.get(f"/groups/{group_id}/expenses/search", params={"q": "uber air"})
+    assert [e["description"] for e in response.json()] == ["Uber to airport"]
+
+    response = client.get(f"/groups/{group_id}/expenses/search", params={"q": "uber", "max_amount": 0})
+    assert response.json() == []
+
+    # Deleted expenses leave the index
+    uber_id = next(e["id"] for e in client.get(f"/groups/{group_id}/expenses/search", params={"q": "uber"}).json())
+    assert client.delete(f"/groups/{group_id}/expenses/{uber_id}").status_code == 200
+    response = client.get(f"/groups/{group_id}/expenses/search", params={"q": "uber"})
+    assert [e["description"] for e in response.json()] == found[1:]
+
+def test_patch_expense_applies_split_diff_and_balance_delta(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=3, expense_count=1)
+    group_id = group.id
+    expense = db_session.query(models.Expense).one()
+    expense_id = expense.id
+    expense.receipt_url = "https://example.com/receipt.png"
+    db_session.commit()
+    client = make_client(users[0].id)
+    read = client.get(f"/groups/{group_id}/expenses/{expense_id}").json()
+
+    # 30 split 10/10/10 becomes 45 split 20/25 between the first two users
+    response = client.patch(f"/groups/{group_id}/expenses/{expense_id}", json={
+        "amount": 45.0,
+        "description": "Dinner and drinks",
+        "split": {"mode": "exact", "amounts": {str(users[0].id): 20.0, str(users[1].id): 25.0}},
+        "expected_updated_at": read["updated_at"]
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["amount"] == 45.0 and body["description"] == "Dinner and drinks"
+    assert body["receipt_url"] == "https://example.com/receipt.png"
+    assert sorted(s["amount"] for s in body["splits"]) == [20.0, 25.0]
+    db_session.expire_all()
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+    # The earlier read is now stale
+    response = client.patch(f"/groups/{group_id}/expenses/{expense_id}", json={
+        "description": "Lost update",
+        "expected_updated_at": read["updated_at"]
+    })
+    assert response.status_code == 409
+
+    # Changing the amount without new splits must keep them consistent
+    response = client.patch(f"/groups/{group_id}/expenses/{expense_id}", json={"amount": 50.0})
+    assert response.status_code == 400
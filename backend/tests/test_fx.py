@@ -0,0 +1,253 @@
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import uuid4
+import io
+
+import pytest
+
+import models
+from tests.test_analytics import rebuilt_rows, rollup_rows
+from tests.test_balances import seed_group
+from utils.balances import compute_member_balances, find_balance_mismatches
+from utils.fx import CurrencyConverter, RateTable, import_fx_rates, rate_table_cache
+from utils.splits import SplitShare
+
+RATES_CSV = b"""date,currency,rate
+2026-01-02,USD,1.10
+2026-01-02,GBP,0.85
+2026-01-05,USD,1.12
+"""
+
+@pytest.fixture(autouse=True)
+def clear_rate_table():
+    rate_table_cache.clear()
+    yield
+    rate_table_cache.clear()
+
+def test_rate_table_date_lookups():
+    table = RateTable([
+        ("USD", date(2026, 1, 5), Decimal("1.12")),
+        ("USD", date(2026, 1, 2), Decimal("1.10")),
+        ("GBP", date(2026, 1, 2), Decimal("0.80"))
+    ])
+
+    assert table.rate("EUR", date(2026, 1, 1)) == 1
+    # Weekend: the latest earlier rate applies
+    assert table.rate("USD", date(2026, 1, 4)) == Decimal("1.10")
+    assert table.rate("USD", date(2026, 1, 9)) == Decimal("1.12")
+    # Rates that were never imported are not made up from older ones
+    with pytest.raises(ValueError):
+        table.rate("USD", date(2026, 3, 1))
+    assert table.conversion_rate("GBP", "USD", date(2026, 1, 2)) == Decimal("1.375")
+    with pytest.raises(ValueError):
+        table.rate("USD", date(2026, 1, 1))
+    with pytest.raises(ValueError):
+        table.rate("JPY", date(2026, 1, 5))
+
+def test_converted_shares_add_up_to_the_converted_amount():
+    table = RateTable([("USD", date(2026, 1, 2), Decimal("1.10")), ("GBP", date(2026, 1, 2), Decimal("0.85"))])
+    rate_table_cache.set("rates", table)
+    converter = CurrencyConverter(None, "USD")
+    shares = [SplitShare(uuid4(), cents) for cents in (334, 333, 333, 0)]
+
+    amount_cents, converted = converter.expense(1000, shares, "GBP", date(2026, 1, 2))
+    assert amount_cents == 1294
+    assert sum(share.amount_cents for share in converted) == amount_cents
+    assert [share.user_id for share in converted] == [share.user_id for share in shares]
+    for amount_cents, cents in ((0, (0, 0)), (-1000, (-500, -500)), (1000, (1500, -500))):
+        with pytest.raises(ValueError):
+            converter.expense(amount_cents, [SplitShare(uuid4(), c) for c in cents], "GBP", date(2026, 1, 2))
+
+def test_import_fx_rates_upserts(db_session):
+    assert import_fx_rates(db_session, io.BytesIO(RATES_CSV)) == 3
+    assert import_fx_rates(db_session, io.BytesIO(b"Date,Currency,Rate\n2026-01-02,usd,1.11\n")) == 1
+    db_session.commit()
+
+    rates = {(rate.currency, rate.date): rate.rate for rate in db_session.query(models.FxRate)}
+    assert len(rates) == 3
+    assert rates[("USD", date(2026, 1, 2))] == Decimal("1.11")
+
+    with pytest.raises(ValueError):
+        import_fx_rates(db_session, io.BytesIO(b"date,currency,rate\n2026-01-02,USD,abc\n"))
+
+def test_rate_table_reloads_for_days_after_its_latest_rate(db_session, monkeypatch):
+    import_fx_rates(db_session, io.BytesIO(RATES_CSV))
+    db_session.commit()
+    converter = CurrencyConverter(db_session, "EUR")
+    assert converter.rate("USD", date(2026, 1, 5)) == Decimal(1) / Decimal("1.12")
+
+    # Imported by another process, without clearing this one's cache
+    import_fx_rates(db_session, io.BytesIO(b"date,currency,rate\n2026-01-12,USD,1.15\n"))
+    db_session.commit()
+    converter = CurrencyConverter(db_session, "EUR")
+    with pytest.raises(ValueError):
+        converter.rate("USD", date(2026, 1, 12))
+    monkeypatch.setattr(rate_table_cache.get("rates"), "loaded_at", 0)
+    assert converter.rate("USD", date(2026, 1, 12)) == Decimal(1) / Decimal("1.15")
+
+def test_foreign_currency_expenses_convert_to_base_currency(db_session, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=1)
+    group_id = group.id
+    import_fx_rates(db_session, io.BytesIO(RATES_CSV))
+    db_session.commit()
+    client = make_client(users[0].id)
+
+    # 30.00 GBP on a Sunday, at the Friday rate of 1.10 / 0.85 USD per GBP
+    response = client.post(f"/groups/{group_id}/expenses/", json={
+        "amount": 30.0,
+        "description": "Pub",
+        "group_id": str(group_id),
+        "paid_by_id": str(users[0].id),
+        "currency": "gbp",
+        "date": datetime(2026, 1, 4, 20, 0).isoformat(),
+        "split": {"mode": "equal"}
+    })
+    assert response.status_code == 200
+    assert response.json()["currency"] == "GBP"
+    assert response.json()["amount"] == 30.0
+
+    # Settlements convert at the rate of the day they are recorded
+    import_fx_rates(db_session, io.BytesIO(f"date,currency,rate\n{datetime.utcnow().date()},USD,1.12\n".encode()))
+    db_session.commit()
+    rate_table_cache.clear()
+    response = client.post("/settlements", json={
+        "paid_by_id": str(users[1].id), "paid_to_id": str(users[0].id),
+        "amount": 10.0, "currency": "EUR", "group_id": str(group_id)
+    })
+    assert response.status_code == 200
+    assert response.json()["settlement"]["currency"] == "EUR"
+
+    db_session.expire_all()
+    balances = compute_member_balances(db_session, group_id)
+    # 3882 USD cents owed in three shares of 1294, 1120 settled
+    assert balances[users[0].id] == 2000 + 2588 - 1120
+    assert sum(balances.values()) == 0
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+    response = client.post(f"/groups/{group_id}/expenses/", json={
+        "amount": 1000.0,
+        "description": "Sushi",
+        "group_id": str(group_id),
+        "paid_by_id": str(users[0].id),
+        "currency": "JPY",
+        "split": {"mode": "equal"}
+    })
+    assert response.status_code == 400
+    assert "No exchange rate for JPY" in response.json()["detail"]
+
+def test_reversals_use_the_rates_of_the_write(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    import_fx_rates(db_session, io.BytesIO(RATES_CSV))
+    db_session.commit()
+    client = make_client(users[0].id)
+
+    # Written at the rates of 2026-01-05 and 2026-01-02, the latest known
+    created = []
+    for description in ("Hotel", "Dinner"):
+        response = client.post(f"/groups/{group_id}/expenses/", json={
+            "amount": 350.0,
+            "description": description,
+            "group_id": str(group_id),
+            "paid_by_id": str(users[0].id),
+            "currency": "GBP",
+            "date": datetime(2026, 1, 6, 12, 0).isoformat(),
+            "split": {"mode": "equal"}
+        })
+        assert response.status_code == 200
+        created.append(response.json())
+    stored = db_session.query(models.Expense).filter(models.Expense.description == "Hotel").one()
+    assert stored.base_amount_cents == 46118
+    assert sorted(split.base_amount_cents for split in stored.splits) == [23059, 23059]
+
+    # Rates published later for the same day must not change what is reversed
+    import_fx_rates(db_session, io.BytesIO(b"date,currency,rate\n2026-01-06,USD,1.20\n2026-01-06,GBP,0.80\n"))
+    db_session.commit()
+    rate_table_cache.clear()
+
+    response = client.patch(f"/groups/{group_id}/expenses/{created[0]['id']}", json={"description": "Hostel"})
+    assert response.status_code == 200
+    assert client.delete(f"/groups/{group_id}/expenses/{created[1]['id']}").status_code == 200
+
+    db_session.expire_all()
+    assert find_balance_mismatches(db_session, group_id, use_checkpoint=False) == {}
+    balances = compute_member_balances(db_session, group_id, use_checkpoint=False)
+    assert balances == {users[0].id: 23059, users[1].id: -23059}
+    rollup = db_session.query(models.ExpenseRollup).filter(models.ExpenseRollup.group_id == group_id).one()
+    assert (rollup.total_cents, rollup.expense_count) == (46118, 1)
+
+    # Changing the amount is a new write, converted at the rates known now
+    response = client.patch(f"/groups/{group_id}/expenses/{created[0]['id']}", json={
+        "amount": 400.0, "split": {"mode": "equal"}
+    })
+    assert response.status_code == 200
+    db_session.expire_all()
+    assert find_balance_mismatches(db_session, group_id, use_checkpoint=False) == {}
+    assert compute_member_balances(db_session, group_id, use_checkpoint=False)[users[0].id] == 30000
+    # Rebuilding the rollup from the stored amounts gives the same rows
+    incremental = rollup_rows(db_session, group_id)
+    assert rebuilt_rows(db_session, group_id) == incremental == {
+        ("2026-01-01", "uncategorized", users[0].id): (60000, 1)
+    }
+
+def test_position_totals_per_currency(db_session, make_client):
+    trip, users = seed_group(db_session, member_count=2, expense_count=0)
+    alice, bob = users
+    flat = models.Group(name="Flat", base_currency="EUR", members=[alice, bob])
+    db_session.add(flat)
+    db_session.commit()
+    import_fx_rates(db_session, io.BytesIO(RATES_CSV))
+    db_session.commit()
+    client = make_client(alice.id)
+
+    # Alice pays 30.02 GBP in the USD trip (39.56 USD) and 20 EUR in the flat
+    for group, amount, currency in ((trip, 30.02, "GBP"), (flat, 20.0, "EUR")):
+        response = client.post(f"/groups/{group.id}/expenses/", json={
+            "amount": amount,
+            "description": "Shared",
+            "group_id": str(group.id),
+            "paid_by_id": str(alice.id),
+            "currency": currency,
+            "date": datetime(2026, 1, 5).isoformat(),
+            "split": {"mode": "equal"}
+        })
+        assert response.status_code == 200
+
+    summary = client.get("/users/me/balances").json()
+    assert summary["total"] is None
+    assert summary["totals"] == [{"currency": "EUR", "balance": 10.0}, {"currency": "USD", "balance": 19.78}]
+    assert {g["group_name"]: (g["currency"], g["balance"]) for g in summary["groups"]} == {
+        "Trip": ("USD", 19.78), "Flat": ("EUR", 10.0)
+    }
+    assert sorted((c["currency"], c["balance"]) for c in summary["counterparties"]) == [("EUR", 10.0), ("USD", 19.78)]
+
+def test_bulk_rejects_only_the_expenses_without_a_rate(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    import_fx_rates(db_session, io.BytesIO(RATES_CSV))
+    db_session.commit()
+    client = make_client(users[0].id)
+
+    def payload(currency):
+        return {
+            "amount": 10.0,
+            "description": "Lunch",
+            "group_id": str(group_id),
+            "paid_by_id": str(users[0].id),
+            "currency": currency,
+            "date": datetime(2026, 1, 5).isoformat(),
+            "split": {"mode": "equal"}
+        }
+
+    response = client.post(f"/groups/{group_id}/expenses/bulk", json={
+        "mode": "best_effort",
+        "expenses": [payload("GBP"), payload("JPY")]
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["status"] for r in body["results"]] == ["created", "rejected"]
+    assert "No exchange rate for JPY" in body["results"][1]["error"]
+
+    db_session.expire_all()
+    assert db_session.query(models.Expense).count() == 1
+    assert find_balance_mismatches(db_session, group_id, use_checkpoint=False) == {}
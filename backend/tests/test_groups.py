@@ -0,0 +1,41 @@
+import models
+from tests.test_balances import seed_group
+
+def add_groups(db, users, count):
+    for i in range(count):
+        db.add(models.Group(name=f"Group {i}", members=users))
+    db.commit()
+
+def test_group_summaries_in_one_query(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=3, expense_count=2, settlement_count=1)
+    group_id = group.id
+    add_groups(db_session, users[:2], 10)
+    client = make_client(users[1].id)
+
+    query_counter.count = 0
+    response = client.get("/groups/summary")
+    assert response.status_code == 200
+    assert query_counter.count == 2  # current user, summaries
+
+    summaries = response.json()
+    assert len(summaries) == 11
+    assert "members" not in summaries[0]
+    trip = next(summary for summary in summaries if summary["id"] == str(group_id))
+    assert trip["member_count"] == 3
+    assert trip["last_activity"] is not None
+    # Paid one 30.00 expense, owes 10.00 of both, paid 5.00 back to user 0
+    assert trip["balance"] == 15.0
+    assert {summary["member_count"] for summary in summaries if summary["id"] != str(group_id)} == {2}
+    assert {summary["balance"] for summary in summaries if summary["id"] != str(group_id)} == {0.0}
+
+def test_group_list_loads_members_in_constant_queries(db_session, make_client, query_counter):
+    _, users = seed_group(db_session, member_count=3, expense_count=0)
+    add_groups(db_session, users, 10)
+    client = make_client(users[0].id)
+
+    query_counter.count = 0
+    response = client.get("/groups/")
+    assert response.status_code == 200
+    assert len(response.json()) == 11
+    assert all(len(group["members"]) == 3 for group in response.json())
+    assert query_counter.count == 3  # current user, groups, members
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import models
+import schemas
+from tests.test_balances import seed_group
+from tests.test_expenses import expense_payload
+from utils.balances import find_balance_mismatches
+from utils.idempotency import request_fingerprint
+
+def test_expense_retry_replays_stored_response(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    group_id = group.id
+    client = make_client(users[0].id)
+    payload = expense_payload(group, users[0], users)
+    headers = {"Idempotency-Key": "expense-1"}
+
+    first = client.post(f"/groups/{group_id}/expenses/", json=payload, headers=headers)
+    assert first.status_code == 200
+
+    # The replay reads the key and nothing else
+    query_counter.count = 0
+    second = client.post(f"/groups/{group_id}/expenses/", json=payload, headers=headers)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert query_counter.count == 2  # current user, idempotency key
+
+    assert db_session.query(models.Expense).count() == 1
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+    # Same key, different request
+    payload["description"] = "Lunch"
+    response = client.post(f"/groups/{group_id}/expenses/", json=payload, headers=headers)
+    assert response.status_code == 422
+
+    # Without a key every request creates an expense
+    client.post(f"/groups/{group_id}/expenses/", json=payload)
+    client.post(f"/groups/{group_id}/expenses/", json=payload)
+    assert db_session.query(models.Expense).count() == 3
+
+def test_settlement_retry_replays_stored_response(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=1)
+    group_id = group.id
+    client = make_client(users[0].id)
+    payload = {"paid_by_id": str(users[1].id), "paid_to_id": str(users[0].id), "amount": 5.0, "group_id": str(group_id)}
+    headers = {"Idempotency-Key": "settlement-1"}
+
+    first = client.post("/settlements", json=payload, headers=headers)
+    second = client.post("/settlements", json=payload, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert first.json()["settlement"]["amount"] == 5.0
+    assert db_session.query(models.Settlement).count() == 1
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+def test_unfinished_and_expired_keys(db_session, make_client):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    payload = expense_payload(group, users[0], users)
+    fingerprint = request_fingerprint(f"POST /groups/{group_id}/expenses", schemas.ExpenseCreate(**payload))
+    now = datetime.utcnow()
+    db_session.add_all([
+        # Claimed by a request that has not stored its response
+        models.IdempotencyKey(
+            user_id=users[0].id, key="pending", request_hash=fingerprint, expires_at=now + timedelta(hours=1)
+        ),
+        models.IdempotencyKey(
+            user_id=users[0].id, key="expired", request_hash="x", status_code=200, response={},
+            expires_at=now - timedelta(seconds=1)
+        )
+    ])
+    db_session.commit()
+    client = make_client(users[0].id)
+
+    response = client.post(f"/groups/{group_id}/expenses/", json=payload, headers={"Idempotency-Key": "pending"})
+    assert response.status_code == 409
+
+    response = client.post(f"/groups/{group_id}/expenses/", json=payload, headers={"Idempotency-Key": "expired"})
+    assert response.status_code == 200
+    assert db_session.query(models.Expense).count() == 1
@@ -0,0 +1,56 @@
+import re
+
+from sqlalchemy import event
+
+import models
+from tests.test_balances import seed_group
+from utils.balances import compute_member_balances, compute_user_position
+from utils.expenses import group_member_ids
+from utils.membership import member_role
+
+TABLES = set(models.Base.metadata.tables)
+
+def full_scans(db, statement, parameters):
+    """
+    Tables the SQLite plan of statement reads in full: SEARCH steps seek an
+    index, SCAN steps read a whole table or index (subqueries aside).
+    """
+    plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = []
+    for row in plan:
+        match = re.match(r"SCAN (\w+)", row[-1])
+        if match and match.group(1) in TABLES:
+            scans.append(match.group(1))
+    return scans
+
+def test_hot_queries_use_indexes(db_session, db_engine, make_client):
+    group, users = seed_group(db_session, member_count=4, expense_count=40, settlement_count=10)
+    group_id, user_id = group.id, users[0].id
+    client = make_client(user_id)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(db_engine, "before_cursor_execute", capture)
+    try:
+        compute_member_balances(db_session, group_id, use_checkpoint=False)
+        compute_user_position(db_session, user_id)
+        group_member_ids(db_session, group_id)
+        member_role(db_session, group_id, user_id)
+        assert client.get(f"/groups/{group_id}/expenses/").status_code == 200
+        assert client.get(f"/groups/{group_id}/expenses/balances").status_code == 200
+        assert client.get("/groups/summary").status_code == 200
+        assert client.get("/groups/").status_code == 200
+    finally:
+        event.remove(db_engine, "before_cursor_execute", capture)
+
+    assert statements
+    offenders = {}
+    for statement, parameters in statements:
+        scans = full_scans(db_session, statement, parameters)
+        if scans:
+            offenders[statement] = scans
+    assert offenders == {}
@@ -0,0 +1,107 @@
+from uuid import UUID, uuid4
+
+import models
+from tests.test_balances import seed_group
+from utils.membership import membership_cache
+
+def test_membership_is_cached_and_invalidated(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=2, expense_count=1)
+    group_id = group.id
+    outsider = models.User(email="outsider@example.com", full_name="Outsider", hashed_password="x")
+    db_session.add(outsider)
+    db_session.commit()
+    outsider_id = outsider.id
+
+    # Non-members are not cached, so they are let in as soon as they are added
+    response = make_client(outsider_id).get(f"/groups/{group_id}/expenses/")
+    assert response.status_code == 404
+    response = make_client(users[1].id).post(f"/groups/{group_id}/members/{outsider_id}")
+    assert response.status_code == 200
+    assert make_client(outsider_id).get(f"/groups/{group_id}/expenses/").status_code == 200
+    assert membership_cache.get((outsider_id, group_id)) == models.GROUP_ROLE_MEMBER
+
+    query_counter.count = 0
+    make_client(outsider_id).get(f"/groups/{group_id}/analytics")
+    assert query_counter.count == 2  # current user, rollup
+
+    # Only the admin can delete the group; its memberships go with it
+    assert make_client(outsider_id).delete(f"/groups/{group_id}").status_code == 403
+    assert make_client(users[0].id).delete(f"/groups/{group_id}").status_code == 200
+    assert membership_cache.get((outsider_id, group_id)) is None
+    assert make_client(outsider_id).get(f"/groups/{group_id}/expenses/").status_code == 404
+
+def test_group_creator_is_admin(db_session, make_client):
+    user = models.User(email="creator@example.com", full_name="Creator", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    client = make_client(user.id)
+
+    response = client.post("/groups/", json={"name": "Flat", "base_currency": "eur"})
+    assert response.status_code == 200
+    assert response.json()["base_currency"] == "EUR"
+    assert [member["id"] for member in response.json()["members"]] == [str(user.id)]
+
+    role = db_session.query(models.group_members.c.role).filter(
+        models.group_members.c.group_id == UUID(response.json()["id"])
+    ).scalar()
+    assert role == models.GROUP_ROLE_ADMIN
+
+def test_bulk_add_members(db_session, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=2, expense_count=0)
+    group_id = group.id
+    new_users = [
+        models.User(email=f"new{i}@example.com", full_name=f"New {i}", hashed_password="x")
+        for i in range(4)
+    ]
+    db_session.add_all(new_users)
+    db_session.commit()
+    new_ids = [user.id for user in new_users]
+    client = make_client(users[0].id)
+    member_id = users[1].id
+    unknown_id = uuid4()
+
+    query_counter.count = 0
+    response = client.post(f"/groups/{group_id}/members/bulk", json={
+        "user_ids": [str(new_ids[0]), str(new_ids[1]), str(member_id), str(unknown_id)],
+        "emails": ["new2@example.com", "new3@example.com", "nobody@example.com"]
+    })
+    assert response.status_code == 200
+    # Current user, membership, resolution, insert, version bump
+    assert query_counter.count == 5
+
+    body = response.json()
+    assert sorted(body["added"]) == sorted(str(user_id) for user_id in new_ids)
+    assert body["already_members"] == [str(member_id)]
+    assert body["not_found"] == [str(unknown_id), "nobody@example.com"]
+
+    response = client.post(f"/groups/{group_id}/members/bulk", json={"emails": ["new0@example.com"]})
+    assert response.json()["added"] == []
+    assert response.json()["already_members"] == [str(new_ids[0])]
+    assert db_session.query(models.group_members).filter(
+        models.group_members.c.group_id == group_id
+    ).count() == 6
+    assert make_client(new_ids[3]).get(f"/groups/{group_id}/expenses/").status_code == 200
+
+def test_added_members_see_the_group_in_their_position(db_session, make_client):
+    group, users = seed_group(db_session, member_count=1, expense_count=0)
+    group_id = group.id
+    new_users = [
+        models.User(email=f"new{i}@example.com", full_name=f"New {i}", hashed_password="x")
+        for i in range(2)
+    ]
+    db_session.add_all(new_users)
+    db_session.commit()
+    new_ids = [user.id for user in new_users]
+
+    # Both positions are cached before the users join
+    for user_id in new_ids:
+        assert make_client(user_id).get("/users/me/balances").json()["groups"] == []
+
+    admin = make_client(users[0].id)
+    assert admin.post(f"/groups/{group_id}/members/{new_ids[0]}").status_code == 200
+    response = admin.post(f"/groups/{group_id}/members/bulk", json={"user_ids": [str(new_ids[1])]})
+    assert response.json()["added"] == [str(new_ids[1])]
+
+    for user_id in new_ids:
+        groups = make_client(user_id).get("/users/me/balances").json()["groups"]
+        assert [g["group_id"] for g in groups] == [str(group_id)]
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+import models
+from tests.test_balances import seed_group
+from utils.balances import find_balance_mismatches
+from utils.recurring import materialize_due, occurrence
+
+def test_monthly_occurrences_keep_the_day_of_month():
+    start = datetime(2026, 1, 31, 9, 0)
+    assert [occurrence(start, "monthly", 1, i).date().isoformat() for i in range(4)] == [
+        "2026-01-31", "2026-02-28", "2026-03-31", "2026-04-30"
+    ]
+    assert occurrence(datetime(2024, 2, 29), "yearly", 1, 1) == datetime(2025, 2, 28)
+    assert occurrence(start, "weekly", 2, 1) == datetime(2026, 2, 14, 9, 0)
+
+def create_template(client, group, users, **fields):
+    response = client.post(f"/groups/{group.id}/recurring-expenses/", json={
+        "amount": 90.0,
+        "description": "Rent",
+        "paid_by_id": str(users[0].id),
+        "split": {"mode": "equal"},
+        "frequency": "monthly",
+        "start_date": "2026-01-01T00:00:00",
+        **fields
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def test_materialize_catches_up_missed_runs(db_session, db_engine, make_client):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    group_id = group.id
+    client = make_client(users[0].id)
+    create_template(client, group, users, end_date="2026-12-31T00:00:00")
+    session_factory = sessionmaker(bind=db_engine)
+
+    # Down since January: four months are due
+    assert materialize_due(session_factory, now=datetime(2026, 4, 15)) == 4
+    assert materialize_due(session_factory, now=datetime(2026, 4, 15)) == 0
+
+    db_session.expire_all()
+    dates = sorted(e.date for e in db_session.query(models.Expense).all())
+    assert [d.month for d in dates] == [1, 2, 3, 4]
+    assert find_balance_mismatches(db_session, group_id) == {}
+
+    template = client.get(f"/groups/{group_id}/recurring-expenses/").json()[0]
+    assert template["occurrences"] == 4
+    assert template["next_run"] == "2026-05-01T00:00:00"
+
+    # The schedule stops after end_date
+    assert materialize_due(session_factory, now=datetime(2027, 6, 1)) == 8
+    assert client.get(f"/groups/{group_id}/recurring-expenses/").json()[0]["next_run"] is None
+
+def test_materialize_query_count_does_not_grow_with_occurrences(db_session, db_engine, make_client, query_counter):
+    group, users = seed_group(db_session, member_count=3, expense_count=0)
+    client = make_client(users[0].id)
+    session_factory = sessionmaker(bind=db_engine)
+
+    counts = []
+    for month, days in [(1, 3), (3, 30)]:
+        create_template(
+            client, group, users, frequency="daily",
+            start_date=datetime(2026, month, 1).isoformat(),
+            end_date=datetime(2026, month, days).isoformat()
+        )
+        query_counter.count = 0
+        assert materialize_due(session_factory, now=datetime(2026, month, days, 12)) == days
+        counts.append(query_counter.count)
+
+    assert counts[0] == counts[1]
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from utils.settlement_planner import plan_exact, plan_greedy, plan_transfers, suggest_settlements
+
+def settle(amounts, transfers):
+    remaining = dict(amounts)
+    for debtor, creditor, amount in transfers:
+        assert amount > 0
+        remaining[debtor] += amount
+        remaining[creditor] -= amount
+    return remaining
+
+def random_balances(rng, n):
+    amounts = {i: rng.choice([-5, -3, -2, -1, 1, 2, 3, 5]) * 100 for i in range(n - 1)}
+    amounts[n - 1] = -sum(amounts.values())
+    return amounts
+
+@pytest.mark.parametrize("planner", [plan_greedy, plan_exact])
+def test_planners_settle_every_balance(planner):
+    rng = random.Random(42)
+    for _ in range(100):
+        amounts = random_balances(rng, rng.randint(1, 10))
+        remaining = settle(amounts, planner(amounts))
+        assert all(amount == 0 for amount in remaining.values())
+
+def test_exact_never_uses_more_transfers_than_greedy():
+    rng = random.Random(7)
+    for _ in range(100):
+        amounts = random_balances(rng, rng.randint(2, 10))
+        assert len(plan_exact(amounts)) <= len(plan_greedy(amounts))
+
+def test_exact_finds_zero_sum_subgroups():
+    # {900, -500, -400} and {600, -300, -300} settle in 2 transfers each,
+    # greedy needs 5
+    amounts = {"a": 900, "b": -500, "c": -400, "d": 600, "e": -300, "f": -300}
+    assert len(plan_greedy(amounts)) == 5
+    assert len(plan_exact(amounts)) == 4
+    amounts = {"a": 500, "b": -300, "c": -200, "d": 700, "e": -700}
+    assert len(plan_exact(amounts)) == 3
+
+def test_exact_rejects_large_groups():
+    amounts = {i: (1 if i % 2 else -1) * (i + 1) for i in range(30)}
+    with pytest.raises(ValueError):
+        plan_exact(amounts)
+    # Auto mode picks the greedy planner, exact mode falls back to it
+    assert plan_transfers(amounts) == (plan_greedy(amounts), False)
+    assert plan_transfers(amounts, "exact") == (plan_greedy(amounts), True)
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        plan_transfers({"a": 100, "b": -100}, "fastest")
+
+def test_suggest_settlements_shape():
+    balances = [
+        {"user_id": "a", "user_name": "Alice", "balance_cents": 1250},
+        {"user_id": "b", "user_name": "Bob", "balance_cents": -1250},
+        {"user_id": "c", "user_name": "Carol", "balance_cents": 0},
+    ]
+    assert suggest_settlements(balances) == ([{
+        "paid_by_id": "b",
+        "paid_by_name": "Bob",
+        "paid_to_id": "a",
+        "paid_to_name": "Alice",
+        "amount_cents": 1250
+    }], False)
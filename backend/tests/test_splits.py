@@ -0,0 +1,37 @@
+from uuid import uuid4
+
+import pytest
+
+from schemas import SplitSpec
+from utils.splits import allocate_cents, expand_split_spec
+
+def test_allocate_cents_uses_largest_remainder():
+    assert allocate_cents(100, [1, 1, 1]) == [34, 33, 33]
+    assert allocate_cents(1000, [1, 2]) == [333, 667]
+    assert allocate_cents(1, [1, 1, 1]) == [1, 0, 0]
+    assert sum(allocate_cents(123457, [3, 7, 11, 13])) == 123457
+
+def test_expand_split_spec_modes():
+    members = sorted([uuid4() for _ in range(3)], key=str)
+    a, b, c = members
+
+    equal = expand_split_spec(1000, SplitSpec(mode="equal", exclude=[c]), members)
+    assert [(s.user_id, s.amount_cents) for s in equal] == [(a, 500), (b, 500)]
+
+    shares = expand_split_spec(1000, SplitSpec(mode="shares", weights={a: 1.5, b: 1, c: 0}), members)
+    assert [(s.user_id, s.amount_cents) for s in shares] == [(a, 600), (b, 400)]
+
+    percentage = expand_split_spec(999, SplitSpec(mode="percentage", weights={a: 50, b: 25, c: 25}), members)
+    assert [s.amount_cents for s in percentage] == [499, 250, 250]
+
+    exact = expand_split_spec(1000, SplitSpec(mode="exact", amounts={a: 2.5, c: 7.5}), members)
+    assert [(s.user_id, s.amount_cents) for s in exact] == [(a, 250), (c, 750)]
+
+@pytest.mark.parametrize("spec", [
+    SplitSpec(mode="percentage", weights={}),
+    SplitSpec(mode="shares", weights={uuid4(): 1}),
+    SplitSpec(mode="equal", include=[]),
+])
+def test_expand_split_spec_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        expand_split_spec(1000, spec, [uuid4()])
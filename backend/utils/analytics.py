@@ -0,0 +1,155 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import logging
+
+from sqlalchemy import extract, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from utils.fx import base_cents_column
+
+logger = logging.getLogger(__name__)
+
+# (month, category, payer) of a group's rollup row
+RollupKey = Tuple[date, str, UUID]
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def rollup_deltas(expenses: Iterable[Tuple[UUID, int, str, datetime]], sign: int = 1) -> Dict[RollupKey, List[int]]:
+    """
+    [amount in cents, expense count] to add per rollup row for expenses given
+    as (paid_by_id, amount_cents, category, date). Use sign=-1 to reverse them.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for paid_by_id, amount_cents, category, expense_date in expenses:
+        delta = deltas[(month_start(expense_date), category, paid_by_id)]
+        delta[0] += sign * amount_cents
+        delta[1] += sign
+    return deltas
+
+def merge_rollup_deltas(*deltas: Dict[RollupKey, List[int]]) -> Dict[RollupKey, List[int]]:
+    """Sum of the given deltas, without the rows they leave unchanged."""
+    merged = defaultdict(lambda: [0, 0])
+    for delta in deltas:
+        for key, (amount_cents, count) in delta.items():
+            merged[key][0] += amount_cents
+            merged[key][1] += count
+    return {key: value for key, value in merged.items() if value != [0, 0]}
+
+def apply_rollup_deltas(db: Session, group_id: UUID, deltas: Dict[RollupKey, List[int]]) -> None:
+    """
+    Add the given deltas to the group's spending rollup with one upsert, so
+    concurrent writers adding the same new row do not collide. Rows left
+    without expenses are deleted. The caller commits, together with the
+    expense write.
+    """
+    if not deltas:
+        return
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    now = datetime.utcnow()
+    statement = dialect.insert(models.ExpenseRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=["group_id", "month", "category", "paid_by_id"],
+        set_={
+            "total_cents": models.ExpenseRollup.total_cents + statement.excluded.total_cents,
+            "expense_count": models.ExpenseRollup.expense_count + statement.excluded.expense_count,
+            "updated_at": statement.excluded.updated_at
+        }
+    )
+    db.execute(statement, [
+        {
+            "group_id": group_id,
+            "month": month,
+            "category": category,
+            "paid_by_id": paid_by_id,
+            "total_cents": amount_cents,
+            "expense_count": count,
+            "updated_at": now
+        }
+        for (month, category, paid_by_id), (amount_cents, count) in deltas.items()
+    ])
+
+    if any(count < 0 for _, count in deltas.values()):
+        db.query(models.ExpenseRollup).filter(
+            models.ExpenseRollup.group_id == group_id,
+            models.ExpenseRollup.expense_count <= 0
+        ).delete(synchronize_session=False)
+
+def rebuild_group_rollups(db: Session, group_id: UUID) -> None:
+    """
+    Overwrite the spending rollup of a group with one aggregated over its
+    expenses, in the base currency amounts stored with them. The caller is
+    responsible for committing.
+    """
+    year = extract("year", models.Expense.date)
+    month = extract("month", models.Expense.date)
+    rows = db.query(
+        year, month, models.Expense.category, models.Expense.paid_by_id,
+        func.sum(base_cents_column(models.Expense)), func.count(models.Expense.id)
+    ).filter(
+        models.Expense.group_id == group_id,
+        models.Expense.paid_by_id.isnot(None),
+        models.Expense.date.isnot(None)
+    ).group_by(year, month, models.Expense.category, models.Expense.paid_by_id).all()
+
+    db.query(models.ExpenseRollup).filter(
+        models.ExpenseRollup.group_id == group_id
+    ).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    for expense_year, expense_month, category, paid_by_id, total_cents, count in rows:
+        db.add(models.ExpenseRollup(
+            group_id=group_id,
+            month=date(int(expense_year), int(expense_month), 1),
+            category=category,
+            paid_by_id=paid_by_id,
+            total_cents=total_cents,
+            expense_count=count,
+            updated_at=now
+        ))
+    logger.info(f"Rebuilt spending rollup for group {group_id}")
+
+def read_group_analytics(
+    db: Session,
+    group_id: UUID,
+    start_month: Optional[date] = None,
+    end_month: Optional[date] = None
+) -> dict:
+    """
+    Monthly spend of a group from its rollup alone: the rollup rows between
+    start_month and end_month (inclusive) and their totals per month,
+    category and payer.
+    """
+    query = db.query(models.ExpenseRollup).filter(models.ExpenseRollup.group_id == group_id)
+    if start_month:
+        query = query.filter(models.ExpenseRollup.month >= month_start(start_month))
+    if end_month:
+        query = query.filter(models.ExpenseRollup.month <= month_start(end_month))
+    rows = query.order_by(
+        models.ExpenseRollup.month, models.ExpenseRollup.category, models.ExpenseRollup.paid_by_id
+    ).all()
+
+    totals = {field: defaultdict(lambda: [0, 0]) for field in ("month", "category", "paid_by_id")}
+    for row in rows:
+        for field, total in totals.items():
+            total[getattr(row, field)][0] += row.total_cents
+            total[getattr(row, field)][1] += row.expense_count
+
+    def totals_by(field):
+        return [
+            {field: key, "total_cents": total_cents, "expense_count": count}
+            for key, (total_cents, count) in sorted(totals[field].items(), key=lambda item: str(item[0]))
+        ]
+
+    return {
+        "group_id": group_id,
+        "rollups": rows,
+        "by_month": totals_by("month"),
+        "by_category": totals_by("category"),
+        "by_payer": totals_by("paid_by_id")
+    }
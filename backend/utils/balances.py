@@ -0,0 +1,452 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+import logging
+import os
+
+from sqlalchemy import and_, func, or_, select, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+from utils.cache import TTLCache, VersionedCache, LRUCacheBackend, RedisCacheBackend
+from utils.fx import base_cents_column
+from utils.settlement_planner import AUTO, suggest_settlements
+
+logger = logging.getLogger(__name__)
+
+# Cross-group net position per user, dropped whenever an expense or settlement
+# in one of the user's groups changes
+user_position_cache = TTLCache(ttl_seconds=300)
+
+def _summary_cache_backend():
+    # Workers share entries through Redis when configured, otherwise each
+    # process keeps its own bounded LRU
+    redis_url = os.getenv("BALANCE_CACHE_REDIS_URL")
+    if redis_url:
+        return RedisCacheBackend(redis_url, prefix="group-balances")
+    return LRUCacheBackend(max_entries=1000)
+
+# Balances and suggested settlements per (group id, group version, mode)
+settlement_summary_cache = VersionedCache(_summary_cache_backend())
+
+# A checkpoint is taken once a group has this many expenses and settlements
+# newer than its latest checkpoint
+CHECKPOINT_INTERVAL = 500
+# Checkpoints only cover records older than this, so a transaction that
+# commits late with an earlier created_at is never skipped by the replay
+CHECKPOINT_SAFETY_LAG = timedelta(minutes=5)
+# Older checkpoints are kept as fallbacks when a newer one is invalidated
+CHECKPOINTS_KEPT = 3
+
+def expense_deltas(paid_by_id: UUID, amount_cents: int, splits: Iterable, sign: int = 1) -> Dict[UUID, int]:
+    """
+    Balance change (in cents) caused by an expense: the payer is credited the
+    full amount and every split user is debited their share. Use sign=-1 to
+    reverse it.
+    """
+    deltas = defaultdict(int)
+    deltas[paid_by_id] += sign * amount_cents
+    for split in splits:
+        deltas[split.user_id] -= sign * split.amount_cents
+    return deltas
+
+def settlement_deltas(paid_by_id: UUID, paid_to_id: UUID, amount_cents: int, sign: int = 1) -> Dict[UUID, int]:
+    """
+    Balance change (in cents) caused by a settlement: the payer's balance goes
+    up and the receiver's goes down.
+    """
+    deltas = defaultdict(int)
+    deltas[paid_by_id] += sign * amount_cents
+    deltas[paid_to_id] -= sign * amount_cents
+    return deltas
+
+def apply_balance_deltas(db: Session, group_id: UUID, deltas: Dict[UUID, int]) -> None:
+    """
+    Add the given deltas to the materialized member balances of a group.
+
+    Rows are locked for the rest of the caller's transaction, so the update is
+    committed (or rolled back) together with the expense/settlement write.
+    """
+    if not deltas:
+        return
+
+    rows = {
+        row.user_id: row
+        for row in db.query(models.GroupMemberBalance).filter(
+            models.GroupMemberBalance.group_id == group_id,
+            models.GroupMemberBalance.user_id.in_(list(deltas.keys()))
+        ).with_for_update().all()
+    }
+
+    now = datetime.utcnow()
+    for user_id, delta in deltas.items():
+        row = rows.get(user_id)
+        if row is None:
+            row = models.GroupMemberBalance(group_id=group_id, user_id=user_id, balance_cents=0)
+            db.add(row)
+        row.balance_cents += delta
+        row.updated_at = now
+
+def bump_group_version(db: Session, group_id: UUID) -> None:
+    """
+    Mark a group as changed, invalidating its cached balance summaries.
+    Must run in the same transaction as the write it accompanies.
+    """
+    db.query(models.Group).filter(models.Group.id == group_id).update(
+        {models.Group.version: models.Group.version + 1},
+        synchronize_session=False
+    )
+
+def read_settlement_summary(db: Session, group: models.Group, mode: Optional[str] = None) -> dict:
+    """
+    Member balances and suggested settlements of a group, cached per group
+    version. Raises ValueError for an unknown settlement mode.
+    """
+    def compute():
+        balances = read_member_balances(db, group)
+        suggested, capped = suggest_settlements(balances, mode)
+        return {
+            "balances": balances,
+            "suggested_settlements": suggested,
+            "exact_capped": capped
+        }
+
+    return settlement_summary_cache.get_or_compute((group.id, group.version, mode or AUTO), compute)
+
+def read_member_balances(db: Session, group: models.Group) -> List[dict]:
+    """
+    Current balance of every member of the group, read from the materialized
+    table (one row per member, independent of the group's history).
+
+    Members and balances are fetched as plain rows in a single query, so large
+    groups don't pay for loading a User instance per member.
+    """
+    rows = db.query(
+        models.User.id,
+        models.User.full_name,
+        models.User.profile_picture_url,
+        models.GroupMemberBalance.balance_cents
+    ).join(
+        models.group_members, models.group_members.c.user_id == models.User.id
+    ).outerjoin(
+        models.GroupMemberBalance,
+        and_(
+            models.GroupMemberBalance.group_id == group.id,
+            models.GroupMemberBalance.user_id == models.User.id
+        )
+    ).filter(models.group_members.c.group_id == group.id).all()
+
+    return [
+        {
+            "user_id": user_id,
+            "user_name": full_name,
+            "profile_picture_url": profile_picture_url,
+            "balance_cents": balance_cents or 0
+        }
+        for user_id, full_name, profile_picture_url, balance_cents in rows
+    ]
+
+def compute_member_balances(db: Session, group_id: UUID, use_checkpoint: bool = True) -> Dict[UUID, int]:
+    """
+    Recompute every balance of a group from its expense and settlement
+    history, in cents. This is the source of truth the materialized table is
+    checked against.
+
+    Starts from the group's latest balance checkpoint (unless use_checkpoint
+    is False) and only replays the records created after it.
+    """
+    checkpoint = latest_checkpoint(db, group_id) if use_checkpoint else None
+    if checkpoint is None:
+        return _aggregate_balances(db, group_id)
+
+    balances = defaultdict(int, {UUID(user_id): cents for user_id, cents in checkpoint.balances.items()})
+    for user_id, cents in _aggregate_balances(db, group_id, after=checkpoint.covered_until).items():
+        balances[user_id] += cents
+    return dict(balances)
+
+def _aggregate_balances(
+    db: Session,
+    group_id: UUID,
+    after: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> Dict[UUID, int]:
+    """
+    Net balances (in cents) from the expenses and settlements of a group
+    created in the window (after, until]. Rows without created_at predate the
+    column and count as the oldest history.
+
+    The work is pushed to the database as four GROUP BY user_id aggregates
+    (paid, owed, settled out, settled in) over the amounts in the group's
+    base currency stored with each record, so the number of queries does not
+    depend on how many expenses the group has.
+    """
+    def window(created_at):
+        conditions = []
+        if after is not None:
+            conditions.append(created_at > after)
+        if until is not None:
+            conditions.append(or_(created_at <= until, created_at.is_(None)))
+        return conditions
+
+    paid = db.query(
+        models.Expense.paid_by_id,
+        func.sum(base_cents_column(models.Expense))
+    ).filter(
+        models.Expense.group_id == group_id,
+        *window(models.Expense.created_at)
+    ).group_by(models.Expense.paid_by_id).all()
+
+    owed = db.query(
+        models.ExpenseSplit.user_id,
+        func.sum(base_cents_column(models.ExpenseSplit))
+    ).join(models.Expense).filter(
+        models.Expense.group_id == group_id,
+        *window(models.Expense.created_at)
+    ).group_by(models.ExpenseSplit.user_id).all()
+
+    settled_out = db.query(
+        models.Settlement.paid_by_id,
+        func.sum(base_cents_column(models.Settlement))
+    ).filter(
+        models.Settlement.group_id == group_id,
+        *window(models.Settlement.created_at)
+    ).group_by(models.Settlement.paid_by_id).all()
+
+    settled_in = db.query(
+        models.Settlement.paid_to_id,
+        func.sum(base_cents_column(models.Settlement))
+    ).filter(
+        models.Settlement.group_id == group_id,
+        *window(models.Settlement.created_at)
+    ).group_by(models.Settlement.paid_to_id).all()
+
+    signed_rows = ((paid, 1), (owed, -1), (settled_out, 1), (settled_in, -1))
+    balances = defaultdict(int)
+    for rows, sign in signed_rows:
+        for user_id, total in rows:
+            balances[user_id] += sign * int(total or 0)
+    return dict(balances)
+
+def find_balance_mismatches(db: Session, group_id: UUID, use_checkpoint: bool = True) -> Dict[UUID, tuple]:
+    """
+    Compare the materialized balances of a group with a full recompute.
+    Returns {user_id: (stored, expected)} in cents for every member that differs.
+    """
+    expected = compute_member_balances(db, group_id, use_checkpoint)
+    stored = dict(
+        db.query(
+            models.GroupMemberBalance.user_id,
+            models.GroupMemberBalance.balance_cents
+        ).filter(models.GroupMemberBalance.group_id == group_id).all()
+    )
+
+    mismatches = {}
+    for user_id in set(expected) | set(stored):
+        stored_balance = stored.get(user_id, 0)
+        expected_balance = expected.get(user_id, 0)
+        if stored_balance != expected_balance:
+            mismatches[user_id] = (stored_balance, expected_balance)
+    return mismatches
+
+def rebuild_group_balances(db: Session, group_id: UUID, use_checkpoint: bool = True) -> None:
+    """
+    Overwrite the materialized balances of a group with a full recompute.
+    The caller is responsible for committing.
+    """
+    expected = compute_member_balances(db, group_id, use_checkpoint)
+    member_ids = [
+        user_id for (user_id,) in db.query(models.group_members.c.user_id).filter(
+            models.group_members.c.group_id == group_id
+        ).distinct().all()
+    ]
+
+    db.query(models.GroupMemberBalance).filter(
+        models.GroupMemberBalance.group_id == group_id
+    ).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    for user_id in set(member_ids) | set(expected):
+        db.add(models.GroupMemberBalance(
+            group_id=group_id,
+            user_id=user_id,
+            balance_cents=expected.get(user_id, 0),
+            updated_at=now
+        ))
+    logger.info(f"Rebuilt balances for group {group_id}")
+
+def invalidate_user_positions(user_ids: Iterable[UUID]) -> None:
+    user_position_cache.invalidate(user_ids)
+
+def read_user_position(db: Session, user_id: UUID) -> dict:
+    """
+    Net position of a user across all their groups: the balance per group, the
+    total, and how much each counterparty owes them (negative: the user owes
+    the counterparty). Cached per user.
+    """
+    position = user_position_cache.get(user_id)
+    if position is None:
+        position = compute_user_position(db, user_id)
+        user_position_cache.set(user_id, position)
+    return position
+
+def compute_user_position(db: Session, user_id: UUID) -> dict:
+    """
+    Uncached cross-group position. Group balances come from the materialized
+    table; counterparties from one set-based query over the pairwise flows of
+    every group the user belongs to. Groups keep their books in different
+    base currencies, so totals are per currency; total_cents is only set
+    when all of the user's groups share one.
+    """
+    member_of = select(models.group_members.c.group_id).where(
+        models.group_members.c.user_id == user_id
+    )
+
+    groups = db.query(
+        models.Group.id,
+        models.Group.name,
+        models.Group.base_currency,
+        models.GroupMemberBalance.balance_cents
+    ).outerjoin(
+        models.GroupMemberBalance,
+        and_(
+            models.GroupMemberBalance.group_id == models.Group.id,
+            models.GroupMemberBalance.user_id == user_id
+        )
+    ).filter(models.Group.id.in_(member_of)).all()
+
+    group = models.Group.__table__
+    expense = models.Expense.__table__
+    split = models.ExpenseSplit.__table__
+    settlement = models.Settlement.__table__
+    expense_splits = split.join(expense, expense.c.id == split.c.expense_id).join(
+        group, group.c.id == expense.c.group_id
+    )
+    settlements = settlement.join(group, group.c.id == settlement.c.group_id)
+
+    # (counterparty, currency, cents) rows in each group's base currency;
+    # positive means the counterparty owes the user
+    flows = union_all(
+        # Expenses the user paid: every other split user owes them their share
+        select(
+            split.c.user_id.label("counterparty_id"),
+            group.c.base_currency.label("currency"),
+            base_cents_column(split.c).label("amount_cents")
+        )
+        .select_from(expense_splits)
+        .where(expense.c.paid_by_id == user_id, split.c.user_id != user_id, expense.c.group_id.in_(member_of)),
+        # Expenses someone else paid: the user owes the payer their share
+        select(expense.c.paid_by_id, group.c.base_currency, -base_cents_column(split.c))
+        .select_from(expense_splits)
+        .where(split.c.user_id == user_id, expense.c.paid_by_id != user_id, expense.c.group_id.in_(member_of)),
+        # Settlements the user paid reduce what they owe the receiver
+        select(settlement.c.paid_to_id, group.c.base_currency, base_cents_column(settlement.c))
+        .select_from(settlements)
+        .where(settlement.c.paid_by_id == user_id, settlement.c.group_id.in_(member_of)),
+        # Settlements the user received reduce what the payer owes them
+        select(settlement.c.paid_by_id, group.c.base_currency, -base_cents_column(settlement.c))
+        .select_from(settlements)
+        .where(settlement.c.paid_to_id == user_id, settlement.c.group_id.in_(member_of)),
+    ).subquery()
+
+    counterparties = db.query(
+        models.User.id,
+        models.User.full_name,
+        flows.c.currency,
+        func.sum(flows.c.amount_cents)
+    ).join(
+        flows, flows.c.counterparty_id == models.User.id
+    ).group_by(models.User.id, models.User.full_name, flows.c.currency).all()
+
+    group_balances = [
+        {"group_id": group_id, "group_name": name, "currency": currency, "balance_cents": balance_cents or 0}
+        for group_id, name, currency, balance_cents in groups
+    ]
+    totals = defaultdict(int)
+    for group_balance in group_balances:
+        totals[group_balance["currency"]] += group_balance["balance_cents"]
+    return {
+        "total_cents": sum(totals.values()) if len(totals) <= 1 else None,
+        "totals": [
+            {"currency": currency, "balance_cents": total}
+            for currency, total in sorted(totals.items())
+        ],
+        "groups": group_balances,
+        "counterparties": [
+            {"user_id": counterparty_id, "user_name": full_name, "currency": currency, "balance_cents": int(total)}
+            for counterparty_id, full_name, currency, total in counterparties
+            if total
+        ]
+    }
+
+def latest_checkpoint(db: Session, group_id: UUID) -> Optional[models.BalanceCheckpoint]:
+    return db.query(models.BalanceCheckpoint).filter(
+        models.BalanceCheckpoint.group_id == group_id
+    ).order_by(models.BalanceCheckpoint.covered_until.desc()).first()
+
+def invalidate_checkpoints(db: Session, group_id: UUID, created_at: Optional[datetime]) -> None:
+    """
+    Drop the checkpoints of a group that include a record created at
+    created_at, because that record is being changed or deleted.
+    """
+    query = db.query(models.BalanceCheckpoint).filter(
+        models.BalanceCheckpoint.group_id == group_id
+    )
+    if created_at is not None:
+        query = query.filter(models.BalanceCheckpoint.covered_until >= created_at)
+    query.delete(synchronize_session=False)
+
+def create_checkpoint_if_due(bind: Engine, group_id: UUID) -> None:
+    """
+    Background task: record a new balance checkpoint for the group once
+    CHECKPOINT_INTERVAL records have been added since its latest one.
+    Runs in its own session because the request's session is closed by then.
+    """
+    db = Session(bind=bind)
+    try:
+        checkpoint = latest_checkpoint(db, group_id)
+        since = checkpoint.covered_until if checkpoint else None
+
+        new_records = 0
+        for model in (models.Expense, models.Settlement):
+            query = db.query(func.count(model.id)).filter(model.group_id == group_id)
+            if since is not None:
+                query = query.filter(model.created_at > since)
+            new_records += query.scalar()
+        if new_records < CHECKPOINT_INTERVAL:
+            return
+
+        cutoff = datetime.utcnow() - CHECKPOINT_SAFETY_LAG
+        if since is not None and cutoff <= since:
+            return
+
+        balances = defaultdict(int)
+        if checkpoint:
+            balances.update({UUID(user_id): cents for user_id, cents in checkpoint.balances.items()})
+        for user_id, cents in _aggregate_balances(db, group_id, after=since, until=cutoff).items():
+            balances[user_id] += cents
+
+        db.add(models.BalanceCheckpoint(
+            group_id=group_id,
+            balances={str(user_id): cents for user_id, cents in balances.items()},
+            covered_until=cutoff
+        ))
+        db.flush()
+
+        # Prune all but the most recent checkpoints
+        stale = db.query(models.BalanceCheckpoint.id).filter(
+            models.BalanceCheckpoint.group_id == group_id
+        ).order_by(models.BalanceCheckpoint.covered_until.desc()).offset(CHECKPOINTS_KEPT).all()
+        if stale:
+            db.query(models.BalanceCheckpoint).filter(
+                models.BalanceCheckpoint.id.in_([checkpoint_id for (checkpoint_id,) in stale])
+            ).delete(synchronize_session=False)
+
+        db.commit()
+        logger.info(f"Created balance checkpoint for group {group_id} covering {new_records} new records")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to create balance checkpoint for group {group_id}: {str(e)}")
+    finally:
+        db.close()
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache whose entries expire after ttl_seconds.
+    Entries can also be dropped explicitly when the data behind them changes.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict_expired()
+                if len(self._entries) >= self.max_entries:
+                    # Still full: drop the entry closest to expiry
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+
+class CacheBackend:
+    """
+    Storage behind a VersionedCache. The default keeps entries in process;
+    other implementations can share them between uvicorn workers.
+    """
+
+    def get(self, key: tuple) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: tuple, value: Any) -> None:
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+class LRUCacheBackend(CacheBackend):
+    """In-process backend bounded to max_entries, evicting least recently used."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend shared by every worker through Redis. Values must be JSON
+    serializable; entries expire after ttl_seconds since versioned keys are
+    never overwritten.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl_seconds: int = 3600):
+        import redis  # Optional dependency, only needed when this backend is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, key: tuple) -> str:
+        return ":".join([self.prefix, *(str(part) for part in key)])
+
+    def get(self, key: tuple) -> Optional[Any]:
+        try:
+            value = self.client.get(self._key(key))
+        except Exception as e:
+            logger.warning(f"Redis cache get failed: {str(e)}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: tuple, value: Any) -> None:
+        try:
+            self.client.set(self._key(key), json.dumps(value, default=str), ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Redis cache set failed: {str(e)}")
+
+class VersionedCache:
+    """
+    Read-through cache for values derived from versioned rows. Keys include
+    the row's version, so bumping the version on every write is the only
+    invalidation needed; stale versions simply age out of the backend.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": self.backend.size()}
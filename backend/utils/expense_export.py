@@ -0,0 +1,113 @@
+from itertools import groupby
+from typing import Iterable, Iterator
+from uuid import UUID
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Session
+
+import models
+from schemas import from_cents
+
+# Rows fetched per round trip from the server-side cursor, and per chunk of
+# streamed output
+EXPORT_BATCH_SIZE = 1000
+
+CSV_COLUMNS = [
+    "expense_id", "date", "description", "amount", "currency", "paid_by_id", "receipt_url",
+    "split_user_id", "split_amount", "split_is_settled"
+]
+
+def iter_export_rows(db: Session, group_id: UUID) -> Result:
+    """
+    One row per expense split (or per expense without splits) of the group,
+    ordered by expense, from a single join. Rows are fetched through a
+    server-side cursor EXPORT_BATCH_SIZE at a time.
+    """
+    query = (
+        select(
+            models.Expense.id,
+            models.Expense.date,
+            models.Expense.description,
+            models.Expense.amount_cents,
+            models.Expense.currency,
+            models.Expense.paid_by_id,
+            models.Expense.receipt_url,
+            models.ExpenseSplit.user_id.label("split_user_id"),
+            models.ExpenseSplit.amount_cents.label("split_amount_cents"),
+            models.ExpenseSplit.is_settled.label("split_is_settled")
+        )
+        .outerjoin(models.ExpenseSplit, models.ExpenseSplit.expense_id == models.Expense.id)
+        .where(models.Expense.group_id == group_id)
+        .order_by(models.Expense.date, models.Expense.id, models.ExpenseSplit.user_id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return db.execute(query)
+
+def _format_amount(cents) -> str:
+    return "" if cents is None else f"{from_cents(cents):.2f}"
+
+def _format(value) -> str:
+    if value is None:
+        return ""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def iter_csv(rows: Iterable) -> Iterator[str]:
+    """CSV with one line per split, yielded in chunks of EXPORT_BATCH_SIZE lines."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([
+            _format(row.id),
+            _format(row.date),
+            row.description or "",
+            _format_amount(row.amount_cents),
+            row.currency,
+            _format(row.paid_by_id),
+            row.receipt_url or "",
+            _format(row.split_user_id),
+            _format_amount(row.split_amount_cents),
+            _format(row.split_is_settled)
+        ])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def iter_ndjson(rows: Iterable) -> Iterator[str]:
+    """One JSON object per expense with its splits nested, in chunks of EXPORT_BATCH_SIZE expenses."""
+    lines = []
+    for expense_id, expense_rows in groupby(rows, key=lambda row: row.id):
+        expense_rows = list(expense_rows)
+        first = expense_rows[0]
+        lines.append(json.dumps({
+            "id": str(expense_id),
+            "date": _format(first.date) or None,
+            "description": first.description,
+            "amount": from_cents(first.amount_cents),
+            "currency": first.currency,
+            "paid_by_id": _format(first.paid_by_id) or None,
+            "receipt_url": first.receipt_url,
+            "splits": [
+                {
+                    "user_id": str(row.split_user_id),
+                    "amount": from_cents(row.split_amount_cents),
+                    "is_settled": row.split_is_settled
+                }
+                for row in expense_rows
+                if row.split_user_id is not None
+            ]
+        }))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,279 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+import uuid
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from utils.analytics import apply_rollup_deltas, merge_rollup_deltas, rollup_deltas
+from utils.balances import apply_balance_deltas, bump_group_version, expense_deltas, invalidate_checkpoints
+from utils.fx import CurrencyConverter, base_cents, group_converter
+from utils.splits import SplitShare, expand_split_spec
+
+class ExpenseConflictError(Exception):
+    """The expense was changed by someone else since the caller read it."""
+
+def group_member_ids(db: Session, group_id: UUID) -> Set[UUID]:
+    return {
+        user_id for (user_id,) in db.query(models.group_members.c.user_id).filter(
+            models.group_members.c.group_id == group_id
+        ).all()
+    }
+
+def expense_shares(
+    expense: schemas.ExpenseCreate,
+    member_ids: Set[UUID],
+    converter: Optional[CurrencyConverter] = None
+) -> List[SplitShare]:
+    """
+    Splits of an expense payload in cents, expanded from its split spec if it
+    has one, validated against the group's member ids and, given the group's
+    converter, against the exchange rates it needs.
+    Raises ValueError when the expense is invalid.
+    """
+    if expense.split is not None:
+        shares = expand_split_spec(expense.amount_cents, expense.split, member_ids)
+    else:
+        shares = [SplitShare(split.user_id, split.amount_cents) for split in expense.splits]
+
+    # Verify all users in splits are group members
+    for share in shares:
+        if share.user_id not in member_ids:
+            raise ValueError(f"User {share.user_id} is not a member of the group")
+
+    # Validate split amounts sum up to total expense amount (exact, in cents)
+    if sum(share.amount_cents for share in shares) != expense.amount_cents:
+        raise ValueError("Split amounts must equal the total expense amount")
+
+    # Fails here, for this expense alone, when no rate converts it
+    if converter is not None:
+        converter.expense(
+            expense.amount_cents, shares,
+            expense.currency or converter.base_currency,
+            expense.date or datetime.utcnow()
+        )
+
+    return shares
+
+def insert_expenses(
+    db: Session,
+    group_id: UUID,
+    expenses: List[Tuple[schemas.ExpenseCreate, List[SplitShare]]]
+) -> List[UUID]:
+    """
+    Insert already validated expenses and their splits with one executemany
+    INSERT per table, and apply their combined balance and spending rollup
+    deltas, converted to the group's base currency. The converted amounts
+    are stored with the rows, so later reversals use the same rates.
+    Raises ValueError when an exchange rate is missing.
+    The caller commits. Returns the new expense ids, in order.
+    """
+    now = datetime.utcnow()
+    converter = group_converter(db, group_id)
+    expense_ids = []
+    expense_rows = []
+    split_rows = []
+    deltas = defaultdict(int)
+    rollup = []
+
+    for expense, shares in expenses:
+        expense_id = uuid.uuid4()
+        expense_ids.append(expense_id)
+        currency = expense.currency or converter.base_currency
+        expense_date = expense.date or now
+        base_amount_cents, base_shares = converter.expense(expense.amount_cents, shares, currency, expense_date)
+        foreign = currency != converter.base_currency
+        expense_rows.append({
+            "id": expense_id,
+            "amount_cents": expense.amount_cents,
+            "base_amount_cents": base_amount_cents if foreign else None,
+            "currency": currency,
+            "description": expense.description,
+            "category": expense.category,
+            "paid_by_id": expense.paid_by_id,
+            "group_id": group_id,
+            "date": expense_date,
+            "created_at": now,
+            "updated_at": now
+        })
+        split_rows.extend(
+            {
+                "id": uuid.uuid4(),
+                "expense_id": expense_id,
+                "user_id": share.user_id,
+                "amount_cents": share.amount_cents,
+                "base_amount_cents": base_share.amount_cents if foreign else None,
+                "is_settled": False,
+                "created_at": now,
+                "updated_at": now
+            }
+            for share, base_share in zip(shares, base_shares)
+        )
+        for user_id, delta in expense_deltas(expense.paid_by_id, base_amount_cents, base_shares).items():
+            deltas[user_id] += delta
+        rollup.append((expense.paid_by_id, base_amount_cents, expense.category, expense_date))
+
+    if expense_rows:
+        db.execute(insert(models.Expense), expense_rows)
+        if split_rows:
+            db.execute(insert(models.ExpenseSplit), split_rows)
+        apply_balance_deltas(db, group_id, deltas)
+        apply_rollup_deltas(db, group_id, rollup_deltas(rollup))
+        bump_group_version(db, group_id)
+
+    return expense_ids
+
+def update_expense(
+    db: Session,
+    expense: models.Expense,
+    changes: schemas.ExpenseUpdate,
+    member_ids: Set[UUID]
+) -> None:
+    """
+    Apply a partial update to an expense (with its splits loaded): only the
+    split rows whose amount changed are written, and member balances move by
+    the net difference between the old and new expense, the old one in the
+    base currency amounts stored with it. The expense row is
+    updated only if its updated_at still matches the one read (or the one
+    the caller expects), otherwise ExpenseConflictError is raised. Raises
+    ValueError for invalid changes. The caller commits.
+    """
+    read_updated_at = expense.updated_at
+    if changes.expected_updated_at is not None and changes.expected_updated_at != read_updated_at:
+        raise ExpenseConflictError()
+
+    fields = changes.model_dump(exclude_unset=True, exclude={"splits", "split", "expected_updated_at"})
+    if fields.get("paid_by_id", expense.paid_by_id) not in member_ids:
+        raise ValueError("The payer must be a member of the group")
+
+    new = schemas.ExpenseCreate(
+        amount=changes.amount if changes.amount is not None else schemas.from_cents(expense.amount_cents),
+        description=changes.description if changes.description is not None else expense.description or "",
+        group_id=expense.group_id,
+        paid_by_id=changes.paid_by_id or expense.paid_by_id,
+        splits=changes.splits,
+        split=changes.split
+    ) if changes.splits is not None or changes.split is not None else None
+
+    old_splits = {split.user_id: split for split in expense.splits}
+    if new is not None:
+        shares = {share.user_id: share.amount_cents for share in expense_shares(new, member_ids)}
+    else:
+        # Keep the splits; they must still add up to the (possibly new) amount
+        shares = {user_id: split.amount_cents for user_id, split in old_splits.items()}
+        amount_cents = schemas.to_cents(changes.amount) if changes.amount is not None else expense.amount_cents
+        if sum(shares.values()) != amount_cents:
+            raise ValueError("Split amounts must equal the total expense amount")
+
+    values = {}
+    if changes.amount is not None:
+        values["amount_cents"] = schemas.to_cents(changes.amount)
+    for field in ("description", "category", "currency", "paid_by_id", "date"):
+        if field in fields and fields[field] is not None:
+            values[field] = fields[field]
+    values["updated_at"] = datetime.utcnow()
+
+    # The old expense in the group's base currency as stored when it was
+    # written; the new one is converted again only if its money changed
+    old_amount_cents = base_cents(expense)
+    old_shares = [SplitShare(split.user_id, base_cents(split)) for split in expense.splits]
+    new_paid_by_id = values.get("paid_by_id", expense.paid_by_id)
+    new_date = values.get("date", expense.date)
+    new_currency = values.get("currency", expense.currency)
+    new_amount = values.get("amount_cents", expense.amount_cents)
+    money_changed = (
+        (new_amount, new_currency, new_date) != (expense.amount_cents, expense.currency, expense.date)
+        or shares != {user_id: split.amount_cents for user_id, split in old_splits.items()}
+    )
+    if money_changed:
+        converter = group_converter(db, expense.group_id)
+        new_amount_cents, new_shares = converter.expense(
+            new_amount,
+            [SplitShare(user_id, cents) for user_id, cents in shares.items()],
+            new_currency,
+            new_date
+        )
+        foreign = new_currency != converter.base_currency
+        values["base_amount_cents"] = new_amount_cents if foreign else None
+        base_shares = {share.user_id: share.amount_cents if foreign else None for share in new_shares}
+    else:
+        new_amount_cents, new_shares = old_amount_cents, old_shares
+        base_shares = {user_id: split.base_amount_cents for user_id, split in old_splits.items()}
+
+    # Conditional update: fails if another writer got there first
+    updated = db.query(models.Expense).filter(
+        models.Expense.id == expense.id,
+        models.Expense.updated_at == read_updated_at
+    ).update(values, synchronize_session=False)
+    if updated != 1:
+        raise ExpenseConflictError()
+
+    # Write only the split rows that changed
+    now = values["updated_at"]
+    removed = [split.id for user_id, split in old_splits.items() if user_id not in shares]
+    changed = [
+        {
+            "split_id": old_splits[user_id].id,
+            "amount_cents": cents,
+            "base_amount_cents": base_shares[user_id],
+            "updated_at": now
+        }
+        for user_id, cents in shares.items()
+        if user_id in old_splits and (
+            old_splits[user_id].amount_cents,
+            old_splits[user_id].base_amount_cents
+        ) != (cents, base_shares[user_id])
+    ]
+    added = [
+        {
+            "id": uuid.uuid4(),
+            "expense_id": expense.id,
+            "user_id": user_id,
+            "amount_cents": cents,
+            "base_amount_cents": base_shares[user_id],
+            "is_settled": False,
+            "created_at": now,
+            "updated_at": now
+        }
+        for user_id, cents in shares.items()
+        if user_id not in old_splits
+    ]
+    if removed:
+        db.query(models.ExpenseSplit).filter(
+            models.ExpenseSplit.id.in_(removed)
+        ).delete(synchronize_session=False)
+    if changed:
+        db.connection().execute(
+            update(models.ExpenseSplit.__table__)
+            .where(models.ExpenseSplit.__table__.c.id == bindparam("split_id"))
+            .values(
+                amount_cents=bindparam("amount_cents"),
+                base_amount_cents=bindparam("base_amount_cents"),
+                updated_at=bindparam("updated_at")
+            ),
+            changed
+        )
+    if added:
+        db.execute(insert(models.ExpenseSplit), added)
+
+    # Net balance change between the old and the new expense
+    deltas: Dict[UUID, int] = defaultdict(int)
+    for user_id, delta in expense_deltas(expense.paid_by_id, old_amount_cents, old_shares, sign=-1).items():
+        deltas[user_id] += delta
+    for user_id, delta in expense_deltas(new_paid_by_id, new_amount_cents, new_shares).items():
+        deltas[user_id] += delta
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+
+    if deltas:
+        apply_balance_deltas(db, expense.group_id, deltas)
+        invalidate_checkpoints(db, expense.group_id, expense.created_at)
+    # Move the expense between spending rollup rows if needed
+    apply_rollup_deltas(db, expense.group_id, merge_rollup_deltas(
+        rollup_deltas([(expense.paid_by_id, old_amount_cents, expense.category, expense.date)], sign=-1),
+        rollup_deltas([(new_paid_by_id, new_amount_cents, values.get("category", expense.category), new_date)])
+    ))
+    bump_group_version(db, expense.group_id)
@@ -0,0 +1,200 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+import codecs
+import csv
+import os
+import time
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from utils.cache import TTLCache
+from utils.splits import SplitShare, allocate_cents
+from utils.statement_import import chunked, parse_date
+
+# Rates are stored as units of a currency per unit of this currency, so any
+# pair converts through it; the ECB publishes its daily rates this way
+FX_REFERENCE_CURRENCY = os.getenv("FX_REFERENCE_CURRENCY", "EUR")
+
+# Rows upserted per statement by the CSV import
+FX_IMPORT_BATCH_SIZE = 1000
+
+# The whole rate table, loaded once per process and reloaded once it is an
+# hour old (corrected past rates), or sooner for a day after its latest rate
+# (new rates imported by other processes, see get_rate_table)
+rate_table_cache = TTLCache(ttl_seconds=3600)
+
+# A day newer than the cached table's latest rate reloads it at most this
+# often, while that day's rates are not published yet
+FX_RELOAD_INTERVAL_SECONDS = 60
+
+# Days without rates (weekends, bank holidays) take the latest earlier rate,
+# at most this old; anything older means the rates were not imported
+FX_MAX_RATE_AGE = timedelta(days=5)
+
+class RateTable:
+    """Daily rates per currency, looked up by date in memory."""
+
+    def __init__(self, rates: Iterable[Tuple[str, date, Decimal]]):
+        self.loaded_at = time.monotonic()
+        by_currency = defaultdict(list)
+        for currency, rate_date, rate in rates:
+            by_currency[currency].append((rate_date, rate))
+        self._dates = {}
+        self._rates = {}
+        for currency, values in by_currency.items():
+            values.sort()
+            self._dates[currency] = [rate_date for rate_date, _ in values]
+            self._rates[currency] = [rate for _, rate in values]
+        self.latest = max((dates[-1] for dates in self._dates.values()), default=None)
+
+    def rate(self, currency: str, on: date) -> Decimal:
+        """
+        Units of currency per unit of the reference currency on a day, from
+        the latest rate published on or before it (no rates on weekends),
+        if that is at most FX_MAX_RATE_AGE old.
+        """
+        if currency == FX_REFERENCE_CURRENCY:
+            return Decimal(1)
+        dates = self._dates.get(currency, [])
+        index = bisect_right(dates, on) - 1
+        if index < 0 or on - dates[index] > FX_MAX_RATE_AGE:
+            raise ValueError(f"No exchange rate for {currency} on {on.isoformat()}")
+        return self._rates[currency][index]
+
+    def conversion_rate(self, from_currency: str, to_currency: str, on: date) -> Decimal:
+        if from_currency == to_currency:
+            return Decimal(1)
+        return self.rate(to_currency, on) / self.rate(from_currency, on)
+
+def get_rate_table(db: Session, on: Optional[date] = None) -> RateTable:
+    """
+    The cached rate table, reloaded first if on is newer than its latest
+    rate and it was not just loaded, so rates imported by another process
+    are used as soon as they are needed.
+    """
+    table = rate_table_cache.get("rates")
+    behind = table is not None and on is not None and (table.latest is None or on > table.latest)
+    if behind and time.monotonic() - table.loaded_at >= FX_RELOAD_INTERVAL_SECONDS:
+        table = None
+    if table is None:
+        table = RateTable(db.query(models.FxRate.currency, models.FxRate.date, models.FxRate.rate).all())
+        rate_table_cache.set("rates", table)
+    return table
+
+def convert_cents(amount_cents: int, rate: Decimal) -> int:
+    return int((Decimal(amount_cents) * rate).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+class CurrencyConverter:
+    """
+    Converts a group's amounts to its base currency. Amounts already in the
+    base currency never touch the rate table; other rates are computed once
+    per (currency, day), so converting a whole history is one pass over it.
+    """
+
+    def __init__(self, db: Session, base_currency: str):
+        self.db = db
+        self.base_currency = base_currency
+        self._rates: Dict[Tuple[str, date], Decimal] = {}
+
+    def rate(self, currency: str, on: datetime) -> Decimal:
+        day = on.date() if isinstance(on, datetime) else on
+        key = (currency, day)
+        if key not in self._rates:
+            self._rates[key] = get_rate_table(self.db, day).conversion_rate(currency, self.base_currency, day)
+        return self._rates[key]
+
+    def amount(self, amount_cents: int, currency: str, on: datetime) -> int:
+        if currency == self.base_currency:
+            return amount_cents
+        return convert_cents(amount_cents, self.rate(currency, on))
+
+    def expense(
+        self,
+        amount_cents: int,
+        shares: Sequence,
+        currency: str,
+        on: datetime
+    ) -> Tuple[int, List[SplitShare]]:
+        """
+        Amount and shares (anything with user_id and amount_cents) of an
+        expense in the base currency, the shares (adding up to the amount) in
+        the order given. The converted amount is allocated over the shares by
+        largest remainder, so they still add up to it exactly.
+        """
+        shares = [SplitShare(share.user_id, share.amount_cents) for share in shares]
+        if currency == self.base_currency:
+            return amount_cents, shares
+
+        if amount_cents <= 0 or any(share.amount_cents < 0 for share in shares):
+            raise ValueError("Only positive amounts with non-negative splits can be converted")
+        converted = self.amount(amount_cents, currency, on)
+        # Remainders go by user id, whatever order the splits were given in
+        order = sorted(range(len(shares)), key=lambda index: str(shares[index].user_id))
+        parts = allocate_cents(converted, [shares[index].amount_cents for index in order])
+        converted_shares = list(shares)
+        for index, part in zip(order, parts):
+            converted_shares[index] = SplitShare(shares[index].user_id, part)
+        return converted, converted_shares
+
+def base_cents(record) -> int:
+    """
+    Amount of an expense, split or settlement in its group's base currency,
+    as stored when it was written. Never converted again.
+    """
+    return record.amount_cents if record.base_amount_cents is None else record.base_amount_cents
+
+def base_cents_column(columns):
+    """base_cents as a SQL expression, over a model or a table's columns."""
+    return func.coalesce(columns.base_amount_cents, columns.amount_cents)
+
+def group_converter(db: Session, group_id: UUID) -> CurrencyConverter:
+    base_currency = db.query(models.Group.base_currency).filter(models.Group.id == group_id).scalar()
+    return CurrencyConverter(db, base_currency or models.DEFAULT_CURRENCY)
+
+def import_fx_rates(db: Session, fileobj: BinaryIO) -> int:
+    """
+    Upsert the daily rates of a CSV file with date, currency and rate
+    columns (units of currency per unit of FX_REFERENCE_CURRENCY), read one
+    line at a time. Returns the number of rates imported. The caller
+    commits, then calls rate_table_cache.clear().
+    """
+    reader = csv.DictReader(codecs.iterdecode(iter(fileobj.readline, b""), "utf-8-sig"))
+    if reader.fieldnames is None:
+        return 0
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    if not {"date", "currency", "rate"} <= set(reader.fieldnames):
+        raise ValueError("FX rate files need date, currency and rate columns")
+
+    def parse(row) -> dict:
+        try:
+            rate = Decimal(row["rate"].strip())
+        except (InvalidOperation, AttributeError):
+            raise ValueError(f"Line {reader.line_num}: unrecognized rate {row['rate']!r}")
+        if rate <= 0:
+            raise ValueError(f"Line {reader.line_num}: rate must be positive")
+        return {
+            "date": parse_date(row["date"]).date(),
+            "currency": row["currency"].strip().upper(),
+            "rate": rate
+        }
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    imported = 0
+    for batch in chunked((parse(row) for row in reader), FX_IMPORT_BATCH_SIZE):
+        statement = dialect.insert(models.FxRate)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["currency", "date"],
+                set_={"rate": statement.excluded.rate}
+            ),
+            batch
+        )
+        imported += len(batch)
+    return imported
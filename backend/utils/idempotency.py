@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from uuid import UUID
+import hashlib
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+# How long a stored response is replayed for; clients retry within minutes,
+# the margin covers devices coming back online the next day
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+class IdempotencyKeyReusedError(Exception):
+    """The key was already used for a different request."""
+
+class IdempotencyKeyInProgressError(Exception):
+    """Another request with the key was started but left no response to replay."""
+
+def request_fingerprint(scope: str, payload: BaseModel) -> str:
+    """Hash of the endpoint and parsed body, telling retries from a reused key."""
+    return hashlib.sha256(f"{scope}\n{payload.model_dump_json()}".encode()).hexdigest()
+
+def _stored_response(db: Session, user_id: UUID, key: str, fingerprint: str) -> Optional[JSONResponse]:
+    record = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key
+    ).first()
+    if record is None:
+        return None
+    if record.expires_at <= datetime.utcnow():
+        # Expired, the key may be used again
+        db.delete(record)
+        db.flush()
+        return None
+    if record.request_hash != fingerprint:
+        raise IdempotencyKeyReusedError("Idempotency-Key was already used for a different request")
+    if record.response is None:
+        raise IdempotencyKeyInProgressError("A request with this Idempotency-Key is still in progress")
+    return JSONResponse(content=record.response, status_code=record.status_code)
+
+def begin_idempotent_request(
+    db: Session,
+    user_id: UUID,
+    key: Optional[str],
+    fingerprint: str
+) -> Tuple[Optional[models.IdempotencyKey], Optional[JSONResponse]]:
+    """
+    Either claim key for a new request, returning the claimed record, or
+    return the stored response of an earlier request with the same key.
+    Both are None when no key was sent. The claim is flushed at once, so a
+    concurrent request with the same key waits on the unique constraint
+    until this transaction ends and then replays its response; it is
+    released if the transaction is rolled back.
+    """
+    if key is None:
+        return None, None
+
+    replay = _stored_response(db, user_id, key, fingerprint)
+    if replay is not None:
+        return None, replay
+
+    now = datetime.utcnow()
+    record = models.IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_hash=fingerprint,
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_KEY_TTL
+    )
+    db.add(record)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Lost the race against a concurrent request with the same key
+        db.rollback()
+        replay = _stored_response(db, user_id, key, fingerprint)
+        if replay is None:
+            raise IdempotencyKeyInProgressError("A request with this Idempotency-Key is still in progress")
+        return None, replay
+    return record, None
+
+def store_idempotent_response(record: Optional[models.IdempotencyKey], response, status_code: int = 200) -> None:
+    """Record the response of a claimed request; committed with the request's own writes."""
+    if record is not None:
+        record.response = jsonable_encoder(response)
+        record.status_code = status_code
+
+def purge_expired_idempotency_keys(bind: Engine) -> None:
+    """Background task: delete the keys past their TTL."""
+    db = Session(bind=bind)
+    try:
+        db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from utils.cache import TTLCache
+
+# Role per (user_id, group_id). Only memberships are cached, so a new member
+# is recognized at once; entries are dropped when members are added or the
+# group is deleted, and other processes catch up within the TTL
+membership_cache = TTLCache(ttl_seconds=300)
+
+def member_role(db: Session, group_id: UUID, user_id: UUID) -> Optional[str]:
+    """Role of the user in the group, None if they are not a member."""
+    key = (user_id, group_id)
+    role = membership_cache.get(key)
+    if role is None:
+        role = db.query(models.group_members.c.role).filter(
+            models.group_members.c.group_id == group_id,
+            models.group_members.c.user_id == user_id
+        ).scalar()
+        if role is not None:
+            membership_cache.set(key, role)
+    return role
+
+def invalidate_memberships(group_id: UUID, user_ids: Iterable[UUID]) -> None:
+    membership_cache.invalidate((user_id, group_id) for user_id in user_ids)
+
+def add_group_members(db: Session, group_id: UUID, user_ids: Iterable[UUID]) -> List[UUID]:
+    """
+    Insert memberships with one INSERT ... ON CONFLICT DO NOTHING, so users
+    added concurrently by another request are skipped rather than failing.
+    Returns the ids actually added. The caller commits, then invalidates
+    their memberships.
+    """
+    rows = [{"group_id": group_id, "user_id": user_id} for user_id in user_ids]
+    if not rows:
+        return []
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(models.group_members).values(rows).on_conflict_do_nothing(
+        index_elements=["group_id", "user_id"]
+    ).returning(models.group_members.c.user_id)
+    return [user_id for (user_id,) in db.execute(statement)]
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+import base64
+import json
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor for the sort key of the last row of a page."""
+    payload = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+def decode_expense_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """(date, id) of the last expense of the previous page."""
+    values = decode_cursor(cursor)
+    try:
+        date, expense_id = values
+        return datetime.fromisoformat(date), UUID(expense_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
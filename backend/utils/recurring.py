@@ -0,0 +1,146 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Set
+from uuid import UUID
+import asyncio
+import logging
+
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from schemas import from_cents
+from utils.balances import create_checkpoint_if_due, invalidate_user_positions
+from utils.expenses import expense_shares, insert_expenses
+
+logger = logging.getLogger(__name__)
+
+# Templates locked and materialized per transaction
+RECURRING_BATCH_SIZE = 100
+
+# Occurrences materialized per template and pass, so a template left behind
+# for years cannot produce one huge transaction; the rest follows next pass
+MAX_CATCH_UP_OCCURRENCES = 500
+
+def occurrence(start: datetime, frequency: str, interval: int, index: int) -> datetime:
+    """
+    Date of the index-th occurrence (0 being start) of a schedule. Monthly
+    and yearly schedules keep start's day of month, clamped to shorter months.
+    """
+    steps = index * interval
+    if frequency == "daily":
+        return start + timedelta(days=steps)
+    if frequency == "weekly":
+        return start + timedelta(weeks=steps)
+    if frequency in ("monthly", "yearly"):
+        months = start.month - 1 + (steps if frequency == "monthly" else 12 * steps)
+        year, month = start.year + months // 12, months % 12 + 1
+        return start.replace(year=year, month=month, day=min(start.day, monthrange(year, month)[1]))
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+def next_run(template: models.RecurringExpense) -> Optional[datetime]:
+    """Next occurrence of a template after the ones already materialized, None once past end_date."""
+    run = occurrence(template.start_date, template.frequency, template.interval, template.occurrences)
+    if template.end_date is not None and run > template.end_date:
+        return None
+    return run
+
+def _materialize_batch(db: Session, now: datetime, batch_size: int):
+    """
+    Lock up to batch_size due templates, skipping those locked by other
+    workers, and insert their due occurrences. Returns the number of
+    templates processed, the number of expenses created and the member ids
+    of the affected groups. The caller commits.
+    """
+    templates = db.query(models.RecurringExpense).filter(
+        models.RecurringExpense.next_run <= now
+    ).order_by(
+        models.RecurringExpense.next_run
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not templates:
+        return 0, 0, {}
+
+    # Members of every group in the batch, in one query
+    members = defaultdict(set)
+    for group_id, user_id in db.query(
+        models.group_members.c.group_id, models.group_members.c.user_id
+    ).filter(
+        models.group_members.c.group_id.in_({template.group_id for template in templates})
+    ):
+        members[group_id].add(user_id)
+
+    pending = defaultdict(list)
+    for template in templates:
+        expense = schemas.ExpenseCreate(
+            amount=from_cents(template.amount_cents),
+            description=template.description,
+            category=template.category,
+            group_id=template.group_id,
+            paid_by_id=template.paid_by_id,
+            split=template.split
+        )
+        try:
+            # Same amount, split and members for every occurrence of this pass
+            shares = expense_shares(expense, members[template.group_id])
+        except ValueError as e:
+            logger.warning(f"Stopping recurring expense {template.id}: {str(e)}")
+            template.next_run = None
+            continue
+
+        for _ in range(MAX_CATCH_UP_OCCURRENCES):
+            if template.next_run is None or template.next_run > now:
+                break
+            pending[template.group_id].append((expense.model_copy(update={"date": template.next_run}), shares))
+            template.occurrences += 1
+            template.next_run = next_run(template)
+
+    for group_id, expenses in pending.items():
+        insert_expenses(db, group_id, expenses)
+
+    return (
+        len(templates),
+        sum(len(expenses) for expenses in pending.values()),
+        {group_id: members[group_id] for group_id in pending}
+    )
+
+def materialize_due(
+    session_factory: Callable[[], Session],
+    now: Optional[datetime] = None,
+    batch_size: int = RECURRING_BATCH_SIZE
+) -> int:
+    """
+    Materialize every occurrence due at now (by default the current time),
+    one transaction per batch of templates. Safe to run from several
+    workers at once. Returns the number of expenses created.
+    """
+    now = now or datetime.utcnow()
+    created = 0
+    while True:
+        with session_factory() as db:
+            try:
+                processed, batch_created, affected = _materialize_batch(db, now, batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            if not processed:
+                return created
+            created += batch_created
+
+            member_ids: Set[UUID] = set().union(*affected.values())
+            invalidate_user_positions(member_ids)
+            for group_id in affected:
+                create_checkpoint_if_due(db.get_bind(), group_id)
+
+async def run_recurring_worker(session_factory: Callable[[], Session], poll_seconds: float) -> None:
+    """Materialize due recurring expenses every poll_seconds until cancelled."""
+    while True:
+        try:
+            created = await asyncio.to_thread(materialize_due, session_factory)
+            if created:
+                logger.info(f"Materialized {created} recurring expenses")
+        except Exception as e:
+            logger.error(f"Recurring expense worker failed: {str(e)}")
+        await asyncio.sleep(poll_seconds)
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+import re
+
+from sqlalchemy import Float, cast, column, func, literal_column, or_, select, table, tuple_
+from sqlalchemy.orm import Session
+
+import models
+from utils.pagination import decode_cursor
+
+# Text search configuration of the Postgres tsvector index; "simple" does no
+# stemming, which suits short merchant names
+TS_CONFIG = "simple"
+
+_expenses_fts = table("expenses_fts", column("expense_id"))
+
+def search_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+def decode_search_cursor(cursor: str) -> Tuple[float, UUID]:
+    """(rank, id) of the last expense of the previous page."""
+    values = decode_cursor(cursor)
+    try:
+        rank, expense_id = values
+        return float(rank), UUID(expense_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _postgres_rank(terms: List[str]):
+    # Full-text match on the tsvector index, fuzzy match (typos, partial
+    # words) on the trigram index; the better of both scores ranks the row
+    text_query = " ".join(terms)
+    # Literal arguments, so the expression matches the GIN index definition
+    document = func.to_tsvector(
+        literal_column(f"'{TS_CONFIG}'"), func.coalesce(models.Expense.description, literal_column("''"))
+    )
+    ts_query = func.plainto_tsquery(literal_column(f"'{TS_CONFIG}'"), text_query)
+    matches = or_(document.op("@@")(ts_query), models.Expense.description.op("%")(text_query))
+    rank = cast(func.greatest(func.ts_rank(document, ts_query), func.similarity(models.Expense.description, text_query)), Float)
+    return None, matches, rank
+
+def _sqlite_rank(terms: List[str]):
+    # FTS5 table; every term must match, as a prefix
+    fts_query = " ".join(f'"{term}"*' for term in terms)
+    matches = (
+        select(_expenses_fts.c.expense_id, (-func.bm25(literal_column("expenses_fts"))).label("rank"))
+        .where(literal_column("expenses_fts").op("MATCH")(fts_query))
+        .subquery()
+    )
+    join = (matches, models.Expense.id == matches.c.expense_id)
+    return join, None, matches.c.rank
+
+def search_expenses(
+    db: Session,
+    group_id: UUID,
+    query: str,
+    limit: int,
+    min_amount_cents: Optional[int] = None,
+    max_amount_cents: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    after: Optional[Tuple[float, UUID]] = None,
+    options=()
+) -> List[Tuple[models.Expense, float]]:
+    """
+    Expenses of the group whose description matches query, best match first,
+    with their rank. Pages are keyset paginated on (rank, id); after is the
+    (rank, id) of the last row of the previous page. Uses the trigram and
+    tsvector indexes on Postgres and the FTS5 table on SQLite.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        join, matches, rank = _postgres_rank(terms)
+    else:
+        join, matches, rank = _sqlite_rank(terms)
+
+    q = db.query(models.Expense, rank.label("rank")).options(*options)
+    if join is not None:
+        q = q.join(*join)
+    if matches is not None:
+        q = q.filter(matches)
+
+    q = q.filter(models.Expense.group_id == group_id)
+    if min_amount_cents is not None:
+        q = q.filter(models.Expense.amount_cents >= min_amount_cents)
+    if max_amount_cents is not None:
+        q = q.filter(models.Expense.amount_cents <= max_amount_cents)
+    if start_date:
+        q = q.filter(models.Expense.date >= start_date)
+    if end_date:
+        q = q.filter(models.Expense.date < end_date)
+    if after:
+        q = q.filter(tuple_(rank, models.Expense.id) < after)
+
+    return q.order_by(rank.desc(), models.Expense.id.desc()).limit(limit).all()
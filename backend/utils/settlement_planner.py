@@ -0,0 +1,160 @@
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+import heapq
+
+GREEDY = "greedy"
+EXACT = "exact"
+AUTO = "auto"
+
+# The exact planner is exponential in the number of members with a non-zero
+# balance, so it is capped low enough to run within a request (a few ms);
+# larger groups get the greedy plan instead.
+EXACT_MAX_PARTICIPANTS = 12
+
+Transfer = Tuple[Hashable, Hashable, int]
+
+def plan_greedy(amounts: Dict[Hashable, int]) -> List[Transfer]:
+    """
+    Settle balances (in cents) by repeatedly matching the largest debtor with
+    the largest creditor. Uses two heaps, so it runs in O(n log n) and needs at
+    most n - 1 transfers.
+    """
+    debtors = [(amount, key) for key, amount in amounts.items() if amount < 0]
+    creditors = [(-amount, key) for key, amount in amounts.items() if amount > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    transfers = []
+    while debtors and creditors:
+        debt, debtor = heapq.heappop(debtors)
+        credit, creditor = heapq.heappop(creditors)
+
+        amount = min(-debt, -credit)
+        transfers.append((debtor, creditor, amount))
+
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, debtor))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, creditor))
+
+    return transfers
+
+def plan_exact(amounts: Dict[Hashable, int]) -> List[Transfer]:
+    """
+    Settle balances (in cents) with the minimum possible number of transfers.
+
+    A group of k balances summing to zero can always be settled in k - 1
+    transfers, so the optimum is n minus the largest number of disjoint
+    zero-sum subsets. That number is found with a DP over subsets, each subset
+    is then settled greedily.
+    """
+    transfers = []
+
+    # Exact opposite balances are always a zero-sum pair in some optimal plan
+    remaining = {key: amount for key, amount in amounts.items() if amount != 0}
+    by_amount = defaultdict(list)
+    for key, amount in remaining.items():
+        if by_amount[-amount]:
+            other = by_amount[-amount].pop()
+            debtor, creditor = (key, other) if amount < 0 else (other, key)
+            transfers.append((debtor, creditor, abs(amount)))
+        else:
+            by_amount[amount].append(key)
+    keys = [key for bucket in by_amount.values() for key in bucket]
+
+    n = len(keys)
+    if n > EXACT_MAX_PARTICIPANTS:
+        raise ValueError(
+            f"Exact settlement planning supports at most {EXACT_MAX_PARTICIPANTS} "
+            f"members with a non-zero balance"
+        )
+    if n == 0:
+        return transfers
+
+    values = [amounts[key] for key in keys]
+    full = (1 << n) - 1
+
+    # sums[mask] is the total balance of the subset, zero_groups[mask] the
+    # largest number of zero-sum subsets it can be split into (plus the
+    # leftover, if any)
+    sums = [0] * (full + 1)
+    zero_groups = bytearray(full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + values[low.bit_length() - 1]
+
+        best = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if zero_groups[mask ^ bit] > best:
+                best = zero_groups[mask ^ bit]
+            rest ^= bit
+        zero_groups[mask] = best + (sums[mask] == 0)
+
+    # Walk back from the full set to recover the zero-sum subsets
+    mask = full
+    boundary = full
+    while mask:
+        target = zero_groups[mask] - (sums[mask] == 0)
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if zero_groups[mask ^ bit] == target:
+                break
+            rest ^= bit
+        mask ^= bit
+        if mask and sums[mask] == 0:
+            subset = boundary ^ mask
+            transfers.extend(plan_greedy({keys[i]: values[i] for i in range(n) if subset >> i & 1}))
+            boundary = mask
+    transfers.extend(plan_greedy({keys[i]: values[i] for i in range(n) if boundary >> i & 1}))
+
+    return transfers
+
+def plan_transfers(amounts: Dict[Hashable, int], mode: Optional[str] = None) -> Tuple[List[Transfer], bool]:
+    """
+    Plan the transfers that settle the given balances (in cents).
+    Mode is "greedy", "exact" or "auto" (the default), which picks the exact
+    planner for small groups and the greedy one otherwise. Returns the
+    transfers, and whether an exact plan was asked for but the greedy one
+    returned because the group is over EXACT_MAX_PARTICIPANTS.
+    """
+    mode = mode or AUTO
+    if mode == AUTO:
+        participants = sum(1 for amount in amounts.values() if amount != 0)
+        mode = EXACT if participants <= EXACT_MAX_PARTICIPANTS else GREEDY
+
+    if mode == GREEDY:
+        return plan_greedy(amounts), False
+    if mode == EXACT:
+        try:
+            return plan_exact(amounts), False
+        except ValueError:
+            return plan_greedy(amounts), True
+    raise ValueError(f"Unknown settlement mode: {mode}")
+
+def suggest_settlements(balances: List[dict], mode: Optional[str] = None) -> Tuple[List[dict], bool]:
+    """
+    Suggested settlements for a list of member balances as returned by
+    utils.balances.read_member_balances, and whether the exact plan was
+    capped (see plan_transfers).
+    """
+    names = {}
+    amounts = {}
+    for balance in balances:
+        user_id = str(balance["user_id"])
+        names[user_id] = balance["user_name"]
+        amounts[user_id] = balance["balance_cents"]
+
+    transfers, capped = plan_transfers(amounts, mode)
+    return [
+        {
+            "paid_by_id": debtor,
+            "paid_by_name": names[debtor],
+            "paid_to_id": creditor,
+            "paid_to_name": names[creditor],
+            "amount_cents": amount
+        }
+        for debtor, creditor, amount in transfers
+    ], capped
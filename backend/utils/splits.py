@@ -0,0 +1,79 @@
+from decimal import Decimal
+from typing import Collection, List, NamedTuple, Sequence
+from uuid import UUID
+
+from schemas import SplitSpec, to_cents
+
+class SplitShare(NamedTuple):
+    user_id: UUID
+    amount_cents: int
+
+def allocate_cents(amount_cents: int, weights: Sequence[int]) -> List[int]:
+    """
+    Split amount_cents proportionally to weights using the largest remainder
+    method, so the parts always add up to the exact amount. Ties go to the
+    earliest weight, which keeps the allocation deterministic.
+    """
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        raise ValueError("Split weights must add up to a positive number")
+
+    parts = []
+    remainders = []
+    for index, weight in enumerate(weights):
+        part, remainder = divmod(amount_cents * weight, total_weight)
+        parts.append(part)
+        remainders.append((-remainder, index))
+
+    for _, index in sorted(remainders)[:amount_cents - sum(parts)]:
+        parts[index] += 1
+    return parts
+
+def _integer_weights(values: Sequence[float]) -> List[int]:
+    # Scale decimal weights such as 1.5 or 33.3 to integers without rounding
+    decimals = [Decimal(str(value)) for value in values]
+    if any(value < 0 for value in decimals):
+        raise ValueError("Split weights must not be negative")
+    places = max((-value.as_tuple().exponent for value in decimals), default=0)
+    scale = 10 ** max(places, 0)
+    return [int(value * scale) for value in decimals]
+
+def _check_members(user_ids: Collection[UUID], member_ids: Collection[UUID]) -> None:
+    for user_id in user_ids:
+        if user_id not in member_ids:
+            raise ValueError(f"User {user_id} is not a member of the group")
+
+def expand_split_spec(amount_cents: int, spec: SplitSpec, member_ids: Collection[UUID]) -> List[SplitShare]:
+    """
+    Expand a compact split spec into one share per participant. Participants
+    are ordered by id, so the same spec always produces the same cents.
+    Raises ValueError for specs that do not fit the expense or the group.
+    """
+    excluded = set(spec.exclude)
+
+    if spec.mode == "equal":
+        participants = spec.include if spec.include is not None else member_ids
+        _check_members(participants, member_ids)
+        user_ids = sorted(set(participants) - excluded, key=str)
+        if not user_ids:
+            raise ValueError("An equal split needs at least one participant")
+        cents = allocate_cents(amount_cents, [1] * len(user_ids))
+
+    elif spec.mode in ("shares", "percentage"):
+        if not spec.weights:
+            raise ValueError(f"A {spec.mode} split needs weights")
+        _check_members(spec.weights, member_ids)
+        user_ids = sorted(set(spec.weights) - excluded, key=str)
+        weights = [spec.weights[user_id] for user_id in user_ids]
+        if spec.mode == "percentage" and sum(Decimal(str(w)) for w in weights) != 100:
+            raise ValueError("Split percentages must add up to 100")
+        cents = allocate_cents(amount_cents, _integer_weights(weights))
+
+    else:  # exact
+        if not spec.amounts:
+            raise ValueError("An exact split needs amounts")
+        _check_members(spec.amounts, member_ids)
+        user_ids = sorted(set(spec.amounts) - excluded, key=str)
+        cents = [to_cents(spec.amounts[user_id]) for user_id in user_ids]
+
+    return [SplitShare(user_id, part) for user_id, part in zip(user_ids, cents) if part]
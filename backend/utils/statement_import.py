@@ -0,0 +1,232 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from uuid import UUID
+import codecs
+import csv
+import re
+
+import schemas
+from schemas import from_cents, to_cents
+
+# Statement files are read and parsed in pieces of this many bytes, so memory
+# use does not depend on the file size
+READ_CHUNK_SIZE = 64 * 1024
+
+# Accepted CSV headers (case-insensitive), first match wins
+DATE_COLUMNS = ("date", "transaction date", "posted date", "posting date", "booking date")
+DESCRIPTION_COLUMNS = ("description", "payee", "name", "merchant", "memo", "details")
+AMOUNT_COLUMNS = ("amount", "value")
+# Statements with separate columns for money out and money in
+DEBIT_COLUMNS = ("debit", "withdrawal", "money out")
+CREDIT_COLUMNS = ("credit", "deposit", "money in")
+
+# Sign of charges in a statement's amount column; the opposite sign marks
+# credits (payments, refunds), which are not imported. OFX always uses
+# negative charges
+CHARGES_NEGATIVE = "negative"
+CHARGES_POSITIVE = "positive"
+CHARGE_SIGNS = (CHARGES_NEGATIVE, CHARGES_POSITIVE)
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y%m%d", "%m/%d/%y")
+
+# (row number, transaction, error): exactly one of transaction and error is set.
+# A transaction is a dict with date, description and amount_cents
+StatementRow = Tuple[int, Optional[dict], Optional[str]]
+# (row number, expense, error), same convention
+ExpenseRow = Tuple[int, Optional[schemas.ExpenseCreate], Optional[str]]
+
+T = TypeVar("T")
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _read_chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    return iter(lambda: fileobj.read(READ_CHUNK_SIZE), b"")
+
+def _read_lines(fileobj: BinaryIO) -> Iterator[bytes]:
+    # Lines are read lazily too, chunk boundaries are handled by the file object
+    return iter(fileobj.readline, b"")
+
+def parse_date(value: str) -> datetime:
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value!r}")
+
+def parse_amount_cents(value: str) -> int:
+    """
+    Signed amount in cents of a statement amount such as "-1,234.50",
+    "$12.00" or "(12.00)", parentheses meaning negative.
+    """
+    negative = value.strip().startswith("(") and value.strip().endswith(")")
+    cleaned = re.sub(r"[^\d.\-]", "", value.replace(",", ""))
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"Unrecognized amount: {value!r}")
+    cents = to_cents(-amount if negative else amount)
+    if cents == 0:
+        raise ValueError("Amount must not be zero")
+    return cents
+
+def charge_cents(value: str, charge_sign: Optional[str] = CHARGES_NEGATIVE) -> int:
+    """
+    Amount in cents of a charge, with charges signed as charge_sign (None:
+    every amount is a charge, whatever its sign). Raises ValueError for
+    credits, so they are reported instead of imported as expenses.
+    """
+    cents = parse_amount_cents(value)
+    if charge_sign is None:
+        return abs(cents)
+    if charge_sign == CHARGES_NEGATIVE:
+        cents = -cents
+    if cents < 0:
+        raise ValueError("Credit (payment or refund), not imported")
+    return cents
+
+def _transaction(
+    date: Optional[str],
+    description: Optional[str],
+    amount: Optional[str],
+    charge_sign: Optional[str] = CHARGES_NEGATIVE
+) -> dict:
+    if not date:
+        raise ValueError("Missing date")
+    if not amount:
+        raise ValueError("Missing amount")
+    return {
+        "date": parse_date(date),
+        "description": (description or "").strip() or "Imported expense",
+        "amount_cents": charge_cents(amount, charge_sign)
+    }
+
+def _find_column(header: List[str], names: Sequence[str]) -> Optional[int]:
+    normalized = [column.strip().lower() for column in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+def iter_csv_transactions(fileobj: BinaryIO, charge_sign: str = CHARGES_NEGATIVE) -> Iterator[StatementRow]:
+    """
+    Charges of a CSV statement, read one line at a time, from its amount
+    column (charges signed as charge_sign) or its debit column. Credits are
+    returned as errors. Row numbers are file line numbers, the header being
+    line 1.
+    """
+    reader = csv.reader(codecs.iterdecode(_read_lines(fileobj), "utf-8-sig", errors="replace"))
+    header = next(reader, None)
+    if header is None:
+        return
+
+    date_column = _find_column(header, DATE_COLUMNS)
+    description_column = _find_column(header, DESCRIPTION_COLUMNS)
+    amount_column = _find_column(header, AMOUNT_COLUMNS)
+    debit_column = _find_column(header, DEBIT_COLUMNS)
+    credit_column = _find_column(header, CREDIT_COLUMNS)
+    if date_column is None or (amount_column is None and debit_column is None):
+        raise ValueError("CSV statements need a date and an amount or debit column")
+
+    for row in reader:
+        if not any(field.strip() for field in row):
+            continue
+
+        def field(column):
+            return row[column] if column is not None and column < len(row) else None
+
+        try:
+            if amount_column is not None:
+                amount, sign = field(amount_column), charge_sign
+            elif (field(credit_column) or "").strip() and not (field(debit_column) or "").strip():
+                raise ValueError("Credit (payment or refund), not imported")
+            else:
+                amount, sign = field(debit_column), None
+            yield reader.line_num, _transaction(
+                field(date_column), field(description_column), amount, sign
+            ), None
+        except ValueError as e:
+            yield reader.line_num, None, str(e)
+
+def _ofx_tokens(fileobj: BinaryIO) -> Iterator[Tuple[str, str]]:
+    # OFX 1.x is SGML without closing tags for leaf elements and OFX 2.x is
+    # XML, both tokenize as <TAG>value; a chunk may end mid-token, so the
+    # last piece is carried over to the next one
+    pending = ""
+    for text in codecs.iterdecode(_read_chunks(fileobj), "utf-8", errors="replace"):
+        pieces = (pending + text).split("<")
+        pending = pieces.pop()
+        for piece in pieces:
+            if piece:
+                tag, _, value = piece.partition(">")
+                yield tag.strip().upper(), value.strip()
+    if pending:
+        tag, _, value = pending.partition(">")
+        yield tag.strip().upper(), value.strip()
+
+def iter_ofx_transactions(fileobj: BinaryIO) -> Iterator[StatementRow]:
+    """
+    Charges of an OFX statement (negative TRNAMT), credits being returned
+    as errors; row numbers count STMTTRN records.
+    """
+    row_number = 0
+    fields = None
+    for tag, value in _ofx_tokens(fileobj):
+        if tag == "STMTTRN":
+            row_number += 1
+            fields = {}
+        elif tag == "/STMTTRN" and fields is not None:
+            try:
+                yield row_number, _transaction(
+                    # DTPOSTED is YYYYMMDD followed by an optional time and zone
+                    fields.get("DTPOSTED", "")[:8],
+                    fields.get("NAME") or fields.get("MEMO"),
+                    fields.get("TRNAMT")
+                ), None
+            except ValueError as e:
+                yield row_number, None, str(e)
+            fields = None
+        elif fields is not None and not tag.startswith("/"):
+            fields[tag] = value
+
+def iter_statement_transactions(
+    fileobj: BinaryIO,
+    statement_format: str,
+    charge_sign: str = CHARGES_NEGATIVE
+) -> Iterator[StatementRow]:
+    if statement_format == "csv":
+        return iter_csv_transactions(fileobj, charge_sign)
+    if statement_format == "ofx":
+        return iter_ofx_transactions(fileobj)
+    raise ValueError(f"Unsupported statement format: {statement_format}")
+
+def to_expenses(
+    rows: Iterable[StatementRow],
+    group_id: UUID,
+    paid_by_id: UUID,
+    split_among: Sequence[UUID]
+) -> Iterator[ExpenseRow]:
+    """Map statement transactions to expenses paid by paid_by_id, split equally between split_among."""
+    split = schemas.SplitSpec(mode="equal", include=list(split_among))
+    for row_number, transaction, error in rows:
+        if error:
+            yield row_number, None, error
+            continue
+
+        yield row_number, schemas.ExpenseCreate(
+            amount=from_cents(transaction["amount_cents"]),
+            description=transaction["description"],
+            group_id=group_id,
+            paid_by_id=paid_by_id,
+            date=transaction["date"],
+            split=split
+        ), None